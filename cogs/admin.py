@@ -525,13 +525,11 @@ class AdminCommands(commands.Cog):
         
         # Voice session metrics
         try:
-            # Import voice_sessions here to avoid circular imports
-            from modules import voice_activity
-            voice_sessions = voice_activity.voice_sessions
+            voice_sessions = self.bot.voice_tracker.sessions
             
             total_sessions = len(voice_sessions)
             total_history = sum(
-                len(session.get("state_history", [])) 
+                len(session.state_history) 
                 for session in voice_sessions.values()
             )
             
@@ -26,6 +26,7 @@ from database import (
 )
 from config import load_config, XP_SETTINGS, QUEST_SETTINGS
 from utils.command_utils import auto_delete_command
+from modules.quest_integration import invalidate_notify_channel
 
 # Load configuration
 config = load_config()
@@ -200,6 +201,7 @@ class ConfigCommands(commands.Cog):
         channel_id = str(channel.id)
         
         await set_level_up_channel(guild_id, channel_id)
+        invalidate_notify_channel(guild_id)
         await interaction.response.send_message(
             f"✅ Level-up notifications will now be sent to {channel.mention}",
             ephemeral=True
@@ -487,6 +489,7 @@ class ConfigCommands(commands.Cog):
         channel_id = str(channel.id)
         
         await set_quest_channel(guild_id, channel_id)
+        invalidate_notify_channel(guild_id)
         await interaction.response.send_message(
             f"✅ Quest notifications will now be sent to {channel.mention}",
             ephemeral=True
@@ -629,6 +632,8 @@ class ConfigCommands(commands.Cog):
         success = await set_quest_reset_time(guild_id, hour)
         
         if success:
+            if hasattr(self.bot, 'quest_manager'):
+                self.bot.quest_manager.reschedule_resets()
             await ctx.send(f"✅ Daily quest reset time set to {hour}:00 UTC")
         else:
             await ctx.send("❌ Failed to update quest reset time")
@@ -694,6 +699,9 @@ class ConfigCommands(commands.Cog):
         success_hour = await set_quest_reset_time(guild_id, reset_hour)
         success_day = await set_quest_reset_day(guild_id, reset_day)
         
+        if success_hour and hasattr(self.bot, 'quest_manager'):
+            self.bot.quest_manager.reschedule_resets()
+        
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         day_name = days[reset_day]
         
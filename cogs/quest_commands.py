@@ -24,6 +24,7 @@ from database import (
 )
 from utils.rate_limiter import rate_limit, guild_key, user_key
 from utils.command_utils import auto_delete_command
+from modules.quest_integration import invalidate_quest_embed
 
 class QuestCommands(commands.Cog):
     def __init__(self, bot):
@@ -414,6 +415,7 @@ class QuestCommands(commands.Cog):
                 success = await delete_quest(quest_id, guild_id)
                 
                 if success:
+                    invalidate_quest_embed(quest_id)
                     await ctx.send(f"✅ Quest **{quest['name']}** has been deleted.")
                 else:
                     await ctx.send("❌ Failed to delete the quest. Please try again.")
@@ -884,6 +886,8 @@ class QuestCommands(commands.Cog):
         success = await update_quest(quest_id, guild_id, field, typed_value)
         
         if success:
+            invalidate_quest_embed(quest_id)
+            
             # Get updated quest
             updated_quest = await get_quest(quest_id)
             
@@ -952,6 +956,7 @@ class QuestCommands(commands.Cog):
             success = await delete_quest(quest_id, guild_id)
             
             if success:
+                invalidate_quest_embed(quest_id)
                 await interaction.followup.send(f"✅ Quest **{quest['name']}** has been deleted.", ephemeral=True)
             else:
                 await interaction.followup.send("❌ Failed to delete the quest. Please try again.", ephemeral=True)
@@ -27,7 +27,8 @@ QUEST_SETTINGS = {
         "total_reactions": 10,   # 10 seconds between reaction quest updates
         "commands_used": 10,     # 10 seconds between command quest updates
         "voice_time_seconds": 0  # No additional cooldown for voice time (already rate-limited by sessions)
-    }
+    },
+    "NOTIFY_WITH_AVATAR": False  # Show the user's avatar as the quest completion embed thumbnail
 }
 
 # Paths
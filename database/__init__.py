@@ -58,6 +58,7 @@ from .events import (
     get_upcoming_xp_boost_events,
     delete_xp_boost_event,
     get_xp_boost_event,
+    get_xp_boost_events_overlapping,
     get_event_xp_multiplier
 )
 
@@ -90,17 +91,24 @@ from .utils import (
 
 from .quests import (
     create_quest,
+    create_quest_for_guilds,
+    create_quests_bulk,
     get_quest,
     update_quest,
     delete_quest,
     get_guild_active_quests,
+    get_guild_active_requirement_types,
+    get_guilds_without_active_quests,
     mark_quests_inactive,
     get_user_quest_progress,
     update_user_quest_progress,
     get_user_active_quests,
     get_user_quest_stats,
     check_quest_progress,
+    update_and_check,
+    update_and_check_batch,
     award_quest_rewards,
+    award_quest_rewards_bulk,
 )
 
 # Import quest cooldown and reset functions
@@ -135,7 +143,8 @@ __all__ = [
     
     # Events
     'create_xp_boost_event', 'get_active_xp_boost_events', 'get_upcoming_xp_boost_events',
-    'delete_xp_boost_event', 'get_xp_boost_event', 'get_event_xp_multiplier',
+    'delete_xp_boost_event', 'get_xp_boost_event', 'get_xp_boost_events_overlapping',
+    'get_event_xp_multiplier',
     
     # Achievements
     'update_activity_counter_db', 'get_user_achievements_db', 'create_achievement_db',
@@ -158,9 +167,11 @@ __all__ = [
 # Add these to __all__ list:
 __all__.extend([
     # Quests
-    'create_quest', 'get_quest', 'update_quest', 'delete_quest',
-    'get_guild_active_quests', 'mark_quests_inactive',
+    'create_quest', 'create_quest_for_guilds', 'create_quests_bulk', 'get_quest', 'update_quest', 'delete_quest',
+    'get_guild_active_quests', 'get_guild_active_requirement_types',
+    'get_guilds_without_active_quests', 'mark_quests_inactive',
     'get_user_quest_progress', 'update_user_quest_progress',
     'get_user_active_quests', 'get_user_quest_stats',
-    'check_quest_progress', 'award_quest_rewards'
+    'check_quest_progress', 'update_and_check',
+    'update_and_check_batch', 'award_quest_rewards', 'award_quest_rewards_bulk'
 ])
\ No newline at end of file
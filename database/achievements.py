@@ -14,36 +14,34 @@ from .cache import (
 from .utils import safe_db_operation
 from .event_db import get_user_event_attendance_count
 
+# Activity counter columns in the levels table
+ACTIVITY_COUNTER_COLUMNS = ("total_messages", "total_reactions", "voice_time_seconds", "commands_used")
+
 async def _update_activity_counter_internal(guild_id: str, user_id: str, counter_type: str, increment: int = 1):
     """Internal function for updating activity counter with safe_db_operation"""
     try:
         async with get_connection() as conn:
             async with conn.transaction():
-                # First, make sure the user exists in the levels table
-                user_check_query = """
-                SELECT 1 FROM levels 
-                WHERE guild_id = $1 AND user_id = $2
-                """
-                user_exists = await conn.fetchval(user_check_query, guild_id, user_id)
-                
-                if not user_exists:
-                    # Create user entry with default values
-                    insert_query = """
-                    INSERT INTO levels (guild_id, user_id, xp, level, last_xp_time, last_role, 
-                                       total_messages, total_reactions, voice_time_seconds, commands_used)
-                    VALUES ($1, $2, 0, 1, $3, NULL, 0, 0, 0, 0)
-                    """
-                    await conn.execute(insert_query, guild_id, user_id, time.time())
-                
-                # Update the counter
+                # Create the user row or bump the counter in one atomic upsert,
+                # instead of checking for the row before updating it
+                counter_columns = ACTIVITY_COUNTER_COLUMNS
+                if counter_type not in counter_columns:
+                    # Other counters (e.g. event_attendance_count) start from the increment too
+                    counter_columns += (counter_type,)
+                counter_values = ", ".join(
+                    "$1" if column == counter_type else "0"
+                    for column in counter_columns
+                )
                 query = f"""
-                UPDATE levels 
-                SET {counter_type} = COALESCE({counter_type}, 0) + $1
-                WHERE guild_id = $2 AND user_id = $3
+                INSERT INTO levels (guild_id, user_id, xp, level, last_xp_time, last_role, 
+                                   {", ".join(counter_columns)})
+                VALUES ($2, $3, 0, 1, $4, NULL, {counter_values})
+                ON CONFLICT (guild_id, user_id)
+                DO UPDATE SET {counter_type} = COALESCE(levels.{counter_type}, 0) + EXCLUDED.{counter_type}
                 RETURNING {counter_type}
                 """
                 
-                new_value = await conn.fetchval(query, increment, guild_id, user_id)
+                new_value = await conn.fetchval(query, increment, guild_id, user_id, time.time())
                 if new_value is None:
                     return -1, []
                 
@@ -19,6 +19,7 @@ server_xp_settings_cache = {}  # {guild_id: (settings_dict, timestamp)}
 active_events_cache = {}   # {guild_id: (events_list, timestamp)}
 upcoming_events_cache = {} # {guild_id: (events_list, timestamp)}
 event_details_cache = {}   # {event_id: (event_dict, timestamp)}
+recent_events_cache = {}   # {guild_id: ((since, events_list), timestamp)}
 
 # Memory-aware caches for achievements
 ACHIEVEMENT_CACHE = MemoryAwareCache(
@@ -119,6 +120,8 @@ def invalidate_guild_cache(guild_id: str):
         del active_events_cache[guild_id]
     if guild_id in upcoming_events_cache:
         del upcoming_events_cache[guild_id]
+    if guild_id in recent_events_cache:
+        del recent_events_cache[guild_id]
     
     logging.debug(f"Cache invalidated for guild {guild_id}")
 
@@ -127,8 +127,9 @@ async def load_channel_boosts(bot):
 
 def apply_channel_boost(base_xp: int, channel_id: str) -> int:
     """Apply channel-specific XP boost if applicable"""
-    if channel_id and channel_id in CHANNEL_XP_BOOSTS:
-        return int(base_xp * CHANNEL_XP_BOOSTS[channel_id])
+    multiplier = CHANNEL_XP_BOOSTS.get(channel_id)
+    if multiplier is not None:
+        return int(base_xp * multiplier)
     return base_xp
 
 async def create_level_role(guild_id: str, level: int, role_id: str):
@@ -306,6 +306,7 @@ async def _create_tables(bot):
                 CREATE INDEX IF NOT EXISTS idx_levels_guild_user ON levels(guild_id, user_id);
                 CREATE INDEX IF NOT EXISTS idx_levels_guild_level ON levels(guild_id, level);
                 CREATE INDEX IF NOT EXISTS idx_xp_events_guild_time ON xp_boost_events(guild_id, start_time, end_time);
+                CREATE INDEX IF NOT EXISTS idx_xp_events_guild_end ON xp_boost_events(guild_id, end_time);
                 CREATE INDEX IF NOT EXISTS idx_custom_backgrounds ON custom_backgrounds(guild_id, user_id);
                 CREATE INDEX IF NOT EXISTS idx_achievements_type ON achievements(requirement_type);
                 CREATE INDEX IF NOT EXISTS idx_user_achievements_guild_user ON user_achievements(guild_id, user_id);
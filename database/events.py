@@ -8,7 +8,8 @@ from typing import Dict, List, Optional
 from .core import get_connection
 from .cache import (
     _get_from_cache, _set_in_cache,
-    active_events_cache, upcoming_events_cache, event_details_cache
+    active_events_cache, upcoming_events_cache, event_details_cache,
+    recent_events_cache
 )
 from .utils import safe_db_operation
 
@@ -43,6 +44,8 @@ async def create_xp_boost_event(guild_id: str, name: str, multiplier: float,
             del active_events_cache[guild_id]
         if guild_id in upcoming_events_cache:
             del upcoming_events_cache[guild_id]
+        if guild_id in recent_events_cache:
+            del recent_events_cache[guild_id]
     
     return event_id
 
@@ -159,6 +162,55 @@ async def get_upcoming_xp_boost_events(guild_id: str) -> list:
     
     return events
 
+async def _get_xp_boost_events_ending_after(guild_id: str, since: float) -> list:
+    """Internal function to get the XP boost events for a guild that end after a time"""
+    try:
+        async with get_connection() as conn:
+            query = """
+            SELECT id, name, multiplier, start_time, end_time, created_by
+            FROM xp_boost_events
+            WHERE guild_id = $1 
+              AND end_time > $2
+              AND active = TRUE
+            ORDER BY start_time ASC
+            """
+            rows = await conn.fetch(query, guild_id, since)
+            
+            return [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "multiplier": row["multiplier"],
+                    "start_time": row["start_time"],
+                    "end_time": row["end_time"],
+                    "created_by": row["created_by"]
+                }
+                for row in rows
+            ]
+    except Exception as e:
+        logging.error(f"Error getting XP boost events ending after {since}: {e}")
+        return None
+
+async def get_xp_boost_events_overlapping(guild_id: str, start_time: float, end_time: float) -> list:
+    """
+    Get the XP boost events for a guild that overlap a time window, including
+    events that have already ended, with caching.
+    
+    The cache holds every event ending after the earliest window start fetched so
+    far, so later windows of the same guild are answered without a query.
+    """
+    cached_value = _get_from_cache(recent_events_cache, guild_id)
+    if cached_value is not None and cached_value[0] <= start_time:
+        events = cached_value[1]
+    else:
+        events = await _get_xp_boost_events_ending_after(guild_id, start_time)
+        if events is None:
+            return []
+        _set_in_cache(recent_events_cache, guild_id, (start_time, events))
+    
+    return [event for event in events
+            if event["end_time"] > start_time and event["start_time"] < end_time]
+
 async def _delete_xp_boost_event(event_id: int) -> bool:
     """Internal function to delete/deactivate an XP boost event"""
     try:
@@ -190,6 +242,8 @@ async def delete_xp_boost_event(event_id: int) -> bool:
             del active_events_cache[guild_id]
         if guild_id in upcoming_events_cache:
             del upcoming_events_cache[guild_id]
+        if guild_id in recent_events_cache:
+            del recent_events_cache[guild_id]
         if event_id in event_details_cache:
             del event_details_cache[event_id]
     
@@ -263,6 +317,8 @@ async def invalidate_boost_caches(event_id: int):
             del active_events_cache[guild_id]
         if guild_id in upcoming_events_cache:
             del upcoming_events_cache[guild_id]
+        if guild_id in recent_events_cache:
+            del recent_events_cache[guild_id]
         if event_id in event_details_cache:
             del event_details_cache[event_id]
 
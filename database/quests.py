@@ -13,7 +13,10 @@ from .cache import _get_from_cache, _set_in_cache
 # Quest-specific caches
 QUEST_CACHE_TTL = 300  # 5 minutes
 quest_cache = {}  # {quest_id: (quest_data, timestamp)}
-active_quests_cache = {}  # {guild_id: (quests_list, timestamp)}
+# Complete cache of every guild's active quests, kept until a quest write invalidates it.
+# Quest counts per guild are tiny and only this process writes quests, so there is no TTL or size limit.
+active_quests_cache = {}  # {guild_id: quests_list}
+active_req_types_cache = {}  # {guild_id: (quests_list, frozenset of requirement types)}
 user_quest_cache = {}  # {(guild_id, user_id): (quests_list, timestamp)}
 user_quest_stats_cache = {}  # {(guild_id, user_id): (stats_dict, timestamp)}
 
@@ -95,6 +98,153 @@ async def create_quest(guild_id: str, name: str, description: str, quest_type: s
     
     return quest_id
 
+async def _create_quest_for_guilds_internal(guild_ids: List[str], name: str, description: str,
+                                           quest_type: str, requirement_type: str,
+                                           requirement_value: int, reward_xp: int,
+                                           reward_multiplier: float = 1.0, difficulty: str = "medium",
+                                           refresh_cycle: str = None) -> List[int]:
+    """Internal function to create the same quest for many guilds in one statement"""
+    try:
+        async with get_connection() as conn:
+            query = """
+            INSERT INTO quests
+                (guild_id, name, description, quest_type, requirement_type,
+                 requirement_value, reward_xp, reward_multiplier, active,
+                 refresh_cycle, difficulty)
+            SELECT t.guild_id, $2, $3, $4, $5, $6, $7, $8, TRUE, $9, $10
+            FROM unnest($1::text[]) AS t(guild_id)
+            RETURNING id
+            """
+
+            rows = await conn.fetch(
+                query, guild_ids, name, description, quest_type, requirement_type,
+                requirement_value, reward_xp, reward_multiplier, refresh_cycle, difficulty
+            )
+
+            logging.info(f"Created quest '{name}' for {len(rows)} guilds")
+            return [row['id'] for row in rows]
+    except Exception as e:
+        logging.error(f"Error creating quest for guilds: {e}")
+        return []
+
+async def create_quest_for_guilds(guild_ids: List[str], name: str, description: str, quest_type: str,
+                                  requirement_type: str, requirement_value: int, reward_xp: int,
+                                  reward_multiplier: float = 1.0, difficulty: str = "medium",
+                                  refresh_cycle: str = None) -> List[int]:
+    """
+    Create the same quest for several guilds with a single INSERT
+
+    Parameters are the same as create_quest, except guild_ids is a list of guild IDs.
+
+    Returns:
+    - List of created quest IDs (empty on error)
+    """
+    if not guild_ids:
+        return []
+
+    if not name or not description:
+        logging.error("Quest name and description are required")
+        return []
+
+    valid_types = ['daily', 'weekly', 'special', 'event', 'challenge']
+    if quest_type not in valid_types:
+        logging.error(f"Invalid quest type: {quest_type}. Must be one of {valid_types}")
+        return []
+
+    valid_req_types = ['total_messages', 'total_reactions', 'voice_time_seconds', 'commands_used']
+    if requirement_type not in valid_req_types:
+        logging.error(f"Invalid requirement type: {requirement_type}. Must be one of {valid_req_types}")
+        return []
+
+    quest_ids = await safe_db_operation(
+        "create_quest_for_guilds_internal", list(guild_ids), name, description, quest_type,
+        requirement_type, requirement_value, reward_xp, reward_multiplier,
+        difficulty, refresh_cycle
+    )
+
+    # Clear guild caches if successful
+    if quest_ids:
+        for guild_id in guild_ids:
+            if guild_id in active_quests_cache:
+                del active_quests_cache[guild_id]
+
+    return quest_ids or []
+
+async def _create_quests_bulk_internal(guild_id: str, quests: List[Dict]) -> List[int]:
+    """Internal function to create several quests for a guild in one statement"""
+    try:
+        async with get_connection() as conn:
+            query = """
+            INSERT INTO quests
+                (guild_id, name, description, quest_type, requirement_type,
+                 requirement_value, reward_xp, reward_multiplier, active,
+                 refresh_cycle, difficulty)
+            SELECT $1, t.name, t.description, t.quest_type, t.requirement_type,
+                   t.requirement_value, t.reward_xp, t.reward_multiplier, TRUE,
+                   t.refresh_cycle, t.difficulty
+            FROM unnest($2::text[], $3::text[], $4::text[], $5::text[], $6::int[],
+                        $7::int[], $8::float8[], $9::text[], $10::text[])
+                AS t(name, description, quest_type, requirement_type, requirement_value,
+                     reward_xp, reward_multiplier, refresh_cycle, difficulty)
+            RETURNING id
+            """
+
+            rows = await conn.fetch(
+                query, guild_id,
+                [quest['name'] for quest in quests],
+                [quest['description'] for quest in quests],
+                [quest['quest_type'] for quest in quests],
+                [quest['requirement_type'] for quest in quests],
+                [quest['requirement_value'] for quest in quests],
+                [quest['reward_xp'] for quest in quests],
+                [quest.get('reward_multiplier', 1.0) for quest in quests],
+                [quest.get('refresh_cycle') for quest in quests],
+                [quest.get('difficulty', 'medium') for quest in quests]
+            )
+
+            logging.info(f"Created {len(rows)} quests for guild {guild_id}")
+            return [row['id'] for row in rows]
+    except Exception as e:
+        logging.error(f"Error creating quests in bulk: {e}")
+        return []
+
+async def create_quests_bulk(guild_id: str, quests: List[Dict]) -> List[int]:
+    """
+    Create several quests for a guild with a single INSERT
+
+    Parameters:
+    - guild_id: Guild ID
+    - quests: Quest dicts with the same keys as the create_quest parameters
+      (reward_multiplier, difficulty and refresh_cycle are optional)
+
+    Returns:
+    - List of created quest IDs (empty on error)
+    """
+    if not quests:
+        return []
+
+    valid_types = ['daily', 'weekly', 'special', 'event', 'challenge']
+    valid_req_types = ['total_messages', 'total_reactions', 'voice_time_seconds', 'commands_used']
+    for quest in quests:
+        if not quest.get('name') or not quest.get('description'):
+            logging.error("Quest name and description are required")
+            return []
+        if quest.get('quest_type') not in valid_types:
+            logging.error(f"Invalid quest type: {quest.get('quest_type')}. Must be one of {valid_types}")
+            return []
+        if quest.get('requirement_type') not in valid_req_types:
+            logging.error(f"Invalid requirement type: {quest.get('requirement_type')}. Must be one of {valid_req_types}")
+            return []
+
+    quest_ids = await safe_db_operation("create_quests_bulk_internal", guild_id, list(quests))
+
+    # Clear guild cache if successful
+    if quest_ids:
+        if guild_id in active_quests_cache:
+            del active_quests_cache[guild_id]
+
+    return quest_ids or []
+
 async def _get_quest_internal(quest_id: int) -> Optional[Dict]:
     """Internal function to get a quest by ID"""
     try:
@@ -267,8 +417,8 @@ async def delete_quest(quest_id: int, guild_id: str) -> bool:
     
     return result
 
-async def _get_guild_active_quests_internal(guild_id: str, quest_type: str = None) -> List[Dict]:
-    """Internal function to get active quests for a guild"""
+async def _get_guild_active_quests_internal(guild_id: str, quest_type: str = None) -> Optional[List[Dict]]:
+    """Internal function to get active quests for a guild (None if the query failed)"""
     try:
         async with get_connection() as conn:
             query = """
@@ -293,7 +443,7 @@ async def _get_guild_active_quests_internal(guild_id: str, quest_type: str = Non
             
     except Exception as e:
         logging.error(f"Error getting guild active quests: {e}")
-        return []
+        return None
 
 async def get_guild_active_quests(guild_id: str, quest_type: str = None) -> List[Dict]:
     """
@@ -306,21 +456,76 @@ async def get_guild_active_quests(guild_id: str, quest_type: str = None) -> List
     Returns:
     - List of quest dictionaries
     """
-    # Use different cache keys based on whether we're filtering by quest_type
-    cache_key = f"{guild_id}_{quest_type}" if quest_type else guild_id
+    # The cache always holds the guild's full active set; filter by type locally
+    quests = active_quests_cache.get(guild_id)
     
-    # Check cache first
-    cached_quests = _get_from_cache(active_quests_cache, cache_key)
-    if cached_quests is not None:
-        return cached_quests
+    if quests is None:
+        quests = await safe_db_operation("get_guild_active_quests_internal", guild_id)
+        if quests is None:
+            # Don't cache a failed lookup; the cache has no TTL and would hide the guild's quests
+            return []
+        active_quests_cache[guild_id] = quests
     
-    # Get from database and cache the result
-    quests = await safe_db_operation("get_guild_active_quests_internal", guild_id, quest_type)
+    if quest_type:
+        return [quest for quest in quests if quest['quest_type'] == quest_type]
+    return quests
+
+async def _get_guilds_without_active_quests_internal(guild_ids: List[str]) -> List[str]:
+    """Internal function to find the guilds that have no active quests"""
+    try:
+        async with get_connection() as conn:
+            query = """
+            SELECT t.guild_id
+            FROM unnest($1::text[]) AS t(guild_id)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM quests q
+                WHERE q.guild_id = t.guild_id AND q.active = TRUE
+            )
+            """
+            rows = await conn.fetch(query, guild_ids)
+            return [row['guild_id'] for row in rows]
+    except Exception as e:
+        logging.error(f"Error finding guilds without active quests: {e}")
+        return None
+
+async def get_guilds_without_active_quests(guild_ids: List[str]) -> set:
+    """
+    Find which of the given guilds have no active quests, in one query
     
-    if quests is not None:
-        _set_in_cache(active_quests_cache, cache_key, quests)
+    Parameters:
+    - guild_ids: Guild IDs to check
     
-    return quests if quests is not None else []
+    Returns:
+    - Set of guild IDs without any active quests (empty on error)
+    """
+    if not guild_ids:
+        return set()
+    
+    result = await safe_db_operation("get_guilds_without_active_quests_internal", list(guild_ids))
+    return set(result or [])
+
+async def get_guild_active_requirement_types(guild_id: str) -> frozenset:
+    """
+    Get the requirement types used by a guild's active quests
+    
+    The set is derived from the active quests cache and rebuilt whenever that
+    cache entry is replaced, so it follows quest creation, edits and resets.
+    
+    Parameters:
+    - guild_id: Guild ID
+    
+    Returns:
+    - frozenset of requirement types ('total_messages', 'voice_time_seconds', etc.)
+    """
+    quests = await get_guild_active_quests(guild_id)
+    
+    cached = active_req_types_cache.get(guild_id)
+    if cached is not None and cached[0] is quests:
+        return cached[1]
+    
+    req_types = frozenset(quest['requirement_type'] for quest in quests)
+    active_req_types_cache[guild_id] = (quests, req_types)
+    return req_types
 
 async def _mark_quests_inactive_internal(guild_id: str, quest_type: str = None) -> bool:
     """Internal function to mark quests as inactive"""
@@ -362,15 +567,8 @@ async def mark_quests_inactive(guild_id: str, quest_type: str = None) -> bool:
     
     # Invalidate caches if successful
     if result:
-        # Clear all related cache keys
         if guild_id in active_quests_cache:
             del active_quests_cache[guild_id]
-            
-        # Also clear any type-specific keys
-        if quest_type:
-            type_key = f"{guild_id}_{quest_type}"
-            if type_key in active_quests_cache:
-                del active_quests_cache[type_key]
     
     return result
 
@@ -450,19 +648,17 @@ async def check_quest_progress(guild_id: str, user_id: str, counter_type: str, c
             
         logging.debug(f"Checking quest progress for {counter_type}, counter_value={counter_value}, session_value={session_value}")
         
-        # Get all active quests for this guild that match the counter type
+        # Get all active quests for this guild that match the counter type (from the in-memory cache)
+        quests = [
+            quest for quest in await get_guild_active_quests(guild_id)
+            if quest['requirement_type'] == counter_type
+        ]
+        
+        if not quests:
+            logging.debug(f"No active quests found for {counter_type} in guild {guild_id}")
+            return []
+        
         async with get_connection() as conn:
-            quest_query = """
-            SELECT id, name, description, requirement_type, requirement_value, reward_xp, reward_multiplier, quest_type
-            FROM quests
-            WHERE guild_id = $1 AND active = TRUE AND requirement_type = $2
-            """
-            quests = await conn.fetch(quest_query, guild_id, counter_type)
-            
-            if not quests:
-                logging.debug(f"No active quests found for {counter_type} in guild {guild_id}")
-                return []
-                
             logging.debug(f"Found {len(quests)} active quests for {counter_type}")
                 
             # Check each quest for progress/completion
@@ -574,6 +770,141 @@ async def check_quest_progress(guild_id: str, user_id: str, counter_type: str, c
         logging.error(f"Error checking quest progress: {e}", exc_info=True)
         return []
 
+async def _update_and_check_batch_internal(counter_type: str,
+                                          entries: List[Tuple[str, str, int]]) -> Dict[Tuple[str, str], Tuple[int, List[Dict]]]:
+    """Internal function to bump a counter and advance matching quests for many users in one statement"""
+    try:
+        async with get_connection() as conn:
+            # counter_type is validated by the public wrappers before it reaches the query
+            query = f"""
+            WITH input AS (
+                SELECT * FROM unnest($1::text[], $2::text[], $3::int[]) AS t(guild_id, user_id, increment)
+            ),
+            counter AS (
+                INSERT INTO levels (guild_id, user_id, xp, level, last_xp_time, last_role, {counter_type})
+                SELECT guild_id, user_id, 0, 1, $4, NULL, increment FROM input
+                ON CONFLICT (guild_id, user_id)
+                DO UPDATE SET {counter_type} = COALESCE(levels.{counter_type}, 0) + EXCLUDED.{counter_type}
+                RETURNING guild_id, user_id, {counter_type} AS value
+            ),
+            progress AS (
+                INSERT INTO user_quests
+                    (guild_id, user_id, quest_id, progress, quest_specific_progress,
+                     completed, completed_at, expires_at)
+                SELECT c.guild_id, c.user_id, q.id, c.value, i.increment,
+                       i.increment >= q.requirement_value,
+                       CASE WHEN i.increment >= q.requirement_value THEN CURRENT_TIMESTAMP END,
+                       CASE q.refresh_cycle
+                           WHEN 'daily' THEN CURRENT_TIMESTAMP + INTERVAL '1 day'
+                           WHEN 'weekly' THEN CURRENT_TIMESTAMP + INTERVAL '7 days'
+                           WHEN 'monthly' THEN CURRENT_TIMESTAMP + INTERVAL '30 days'
+                       END
+                FROM counter c
+                JOIN input i ON i.guild_id = c.guild_id AND i.user_id = c.user_id
+                JOIN quests q ON q.guild_id = c.guild_id AND q.active = TRUE AND q.requirement_type = $5
+                ON CONFLICT (guild_id, user_id, quest_id)
+                DO UPDATE SET
+                    progress = EXCLUDED.progress,
+                    quest_specific_progress = user_quests.quest_specific_progress + EXCLUDED.quest_specific_progress,
+                    completed = user_quests.quest_specific_progress + EXCLUDED.quest_specific_progress >= (
+                        SELECT requirement_value FROM quests WHERE id = EXCLUDED.quest_id
+                    ),
+                    completed_at = CASE
+                        WHEN user_quests.quest_specific_progress + EXCLUDED.quest_specific_progress >= (
+                            SELECT requirement_value FROM quests WHERE id = EXCLUDED.quest_id
+                        ) THEN CURRENT_TIMESTAMP
+                        ELSE user_quests.completed_at
+                    END,
+                    expires_at = EXCLUDED.expires_at
+                WHERE user_quests.completed = FALSE
+                RETURNING guild_id, user_id, quest_id, completed
+            )
+            SELECT c.guild_id, c.user_id, c.value AS counter_value, q.id, q.name, q.description,
+                   q.reward_xp, q.reward_multiplier
+            FROM counter c
+            LEFT JOIN progress p ON p.completed AND p.guild_id = c.guild_id AND p.user_id = c.user_id
+            LEFT JOIN quests q ON q.id = p.quest_id
+            """
+
+            guild_ids = [entry[0] for entry in entries]
+            user_ids = [entry[1] for entry in entries]
+            increments = [entry[2] for entry in entries]
+            rows = await conn.fetch(query, guild_ids, user_ids, increments, time.time(), counter_type)
+
+            results = {}
+            for row in rows:
+                key = (row['guild_id'], row['user_id'])
+                if key not in results:
+                    results[key] = (row['counter_value'], [])
+                if row['id'] is not None:
+                    results[key][1].append({
+                        "id": row['id'],
+                        "name": row['name'],
+                        "description": row['description'],
+                        "reward_xp": row['reward_xp'],
+                        "reward_multiplier": row['reward_multiplier']
+                    })
+            return results
+
+    except Exception as e:
+        logging.error(f"Error updating counters and checking quests: {e}", exc_info=True)
+        return {}
+
+async def update_and_check_batch(counter_type: str,
+                                 entries: List[Tuple[str, str, int]]) -> Dict[Tuple[str, str], Tuple[int, List[Dict]]]:
+    """
+    Increment one activity counter for many users and advance their matching quests in one round-trip
+
+    Quest-specific progress grows by each user's increment (actions, or seconds of voice
+    time), the same way check_quest_progress counts it.
+
+    Parameters:
+    - counter_type: Counter column to increment ('total_messages', 'voice_time_seconds', etc.)
+    - entries: List of (guild_id, user_id, increment); each (guild_id, user_id) at most once
+
+    Returns:
+    - Dict of {(guild_id, user_id): (new counter value, list of newly completed quests)}
+    """
+    valid_req_types = ['total_messages', 'total_reactions', 'voice_time_seconds', 'commands_used']
+    if counter_type not in valid_req_types:
+        logging.error(f"Invalid counter type: {counter_type}. Must be one of {valid_req_types}")
+        return {}
+
+    if not entries:
+        return {}
+
+    results = await safe_db_operation("update_and_check_batch_internal", counter_type, list(entries))
+    if not results:
+        return {}
+
+    # Invalidate caches
+    for cache_key, (new_value, newly_completed) in results.items():
+        if cache_key in user_quest_cache:
+            del user_quest_cache[cache_key]
+        if cache_key in user_quest_stats_cache:
+            del user_quest_stats_cache[cache_key]
+        if newly_completed:
+            logging.info(f"User {cache_key[1]} completed {len(newly_completed)} quests for {counter_type}")
+
+    return results
+
+async def update_and_check(guild_id: str, user_id: str, counter_type: str,
+                           increment: int = 1) -> Tuple[int, List[Dict]]:
+    """
+    Increment an activity counter and advance the user's matching quests in one round-trip
+
+    Parameters:
+    - guild_id: Guild ID
+    - user_id: User ID
+    - counter_type: Counter column to increment ('total_messages', 'voice_time_seconds', etc.)
+    - increment: Amount to add to the counter and to quest progress
+
+    Returns:
+    - Tuple of (new counter value or -1 on error, list of newly completed quests)
+    """
+    results = await update_and_check_batch(counter_type, [(guild_id, user_id, increment)])
+    return results.get((guild_id, user_id), (-1, []))
+
 async def _update_user_quest_progress_internal(guild_id, user_id, quest_id, 
                                             achievement_progress, quest_progress_increment=1,
                                             completed=False):
@@ -866,4 +1197,59 @@ async def award_quest_rewards(guild_id: str, user_id: str, quest_id: int, member
             
     except Exception as e:
         logging.error(f"Error awarding quest rewards: {e}")
-        return False
\ No newline at end of file
+        return False
+
+async def _get_completed_quest_rewards_internal(guild_id: str, user_id: str, quest_ids: List[int]) -> List[Dict]:
+    """Internal function to get the rewards of the quests a user has completed"""
+    try:
+        async with get_connection() as conn:
+            query = """
+            SELECT q.id, q.name, q.reward_xp
+            FROM quests q
+            JOIN user_quests uq ON uq.quest_id = q.id
+            WHERE uq.guild_id = $1 AND uq.user_id = $2 AND uq.completed = TRUE
+              AND q.id = ANY($3::int[])
+            """
+            rows = await conn.fetch(query, guild_id, user_id, quest_ids)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logging.error(f"Error getting completed quest rewards: {e}")
+        return []
+
+async def award_quest_rewards_bulk(guild_id: str, user_id: str, quest_ids: List[int], member) -> List[int]:
+    """
+    Award rewards for several completed quests at once
+    
+    Completion is verified for all quests with one query and the summed XP is
+    awarded with a single XP update.
+    
+    Parameters:
+    - guild_id: Guild ID
+    - user_id: User ID
+    - quest_ids: IDs of the quests to award
+    - member: Discord member object for XP awarding
+    
+    Returns:
+    - List of quest IDs whose rewards were awarded
+    """
+    if not quest_ids:
+        return []
+    
+    try:
+        quests = await safe_db_operation("get_completed_quest_rewards_internal", guild_id, user_id, list(quest_ids))
+        if not quests:
+            return []
+        
+        total_xp = sum(quest['reward_xp'] for quest in quests)
+        
+        # Award XP (use the existing award_xp_without_event_multiplier function)
+        from modules.levels import award_xp_without_event_multiplier
+        await award_xp_without_event_multiplier(guild_id, user_id, total_xp, member)
+        
+        quest_names = ", ".join(quest['name'] for quest in quests)
+        logging.info(f"Awarded {total_xp} XP to {member.name} for completing quests: {quest_names}")
+        return [quest['id'] for quest in quests]
+            
+    except Exception as e:
+        logging.error(f"Error awarding quest rewards: {e}")
+        return []
@@ -136,11 +136,14 @@ async def safe_db_operation(func_name: str, *args, **kwargs):
                                      _get_achievement_stats_internal, _update_achievement_internal,
                                      _delete_achievement_internal, _get_user_selected_title_internal,
                                      _set_user_selected_title_internal)
-            from .quests import (_create_quest_internal, _get_quest_internal, _update_quest_internal,
+            from .quests import (_create_quest_internal, _create_quest_for_guilds_internal,
+                    _create_quests_bulk_internal,
+                    _get_quest_internal, _update_quest_internal,
                     _delete_quest_internal, _get_guild_active_quests_internal,
                     _mark_quests_inactive_internal, _get_user_quest_progress_internal,
                     _update_user_quest_progress_internal, _get_user_active_quests_internal,
-                    _get_user_quest_stats_internal)
+                    _get_user_quest_stats_internal, _update_and_check_batch_internal,
+                    _get_completed_quest_rewards_internal, _get_guilds_without_active_quests_internal)
 
 
             # Map function name to actual function
@@ -166,6 +169,8 @@ async def safe_db_operation(func_name: str, *args, **kwargs):
                 "get_user_selected_title_internal": _get_user_selected_title_internal,
                 "set_user_selected_title_internal": _set_user_selected_title_internal,
                 "create_quest_internal": _create_quest_internal,
+                "create_quest_for_guilds_internal": _create_quest_for_guilds_internal,
+                "create_quests_bulk_internal": _create_quests_bulk_internal,
                 "get_quest_internal": _get_quest_internal,
                 "update_quest_internal": _update_quest_internal,
                 "delete_quest_internal": _delete_quest_internal,
@@ -175,6 +180,9 @@ async def safe_db_operation(func_name: str, *args, **kwargs):
                 "update_user_quest_progress_internal": _update_user_quest_progress_internal,
                 "get_user_active_quests_internal": _get_user_active_quests_internal,
                 "get_user_quest_stats_internal": _get_user_quest_stats_internal,
+                "update_and_check_batch_internal": _update_and_check_batch_internal,
+                "get_completed_quest_rewards_internal": _get_completed_quest_rewards_internal,
+                "get_guilds_without_active_quests_internal": _get_guilds_without_active_quests_internal,
                 "set_achievement_channel": _set_achievement_channel,
                 "set_quest_channel": _set_quest_channel
             }
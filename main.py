@@ -41,15 +41,15 @@ try:
     # Local imports
     from config import load_config
     from database import init_db, close_db
-    from modules.voice_activity import start_voice_tracking, stop_periodic_processing
+    from modules.voice_activity import VoiceTracker, start_voice_tracking
     from modules.levels import handle_message_xp, handle_reaction_xp, award_xp_without_event_multiplier, send_level_up_notification, xp_to_next_level
     from modules.achievements import register_achievement_hooks
-    from modules.quest_integration import initialize_quest_system, voice_handler_with_quests
+    from modules.quest_integration import initialize_quest_system
 
     from utils.async_image_processor import start_image_processor
     from utils.image_templates import initialize_image_templates
-    from utils.avatar_cache import avatar_cache
     from utils.background_api import BACKGROUNDS_DIR
+    from utils.http_session import close_session
     from utils.performance_monitoring import start_monitoring, stop_monitoring, time_function
     from utils.rate_limiter import RateLimiter, RateLimitExceeded
     from utils.database_migration import run_all_migrations
@@ -95,6 +95,10 @@ class LevelingBot(commands.Bot):
         for guild in self.guilds:
             for vc in guild.voice_channels:
                 vc.guild.voice_client
+        
+        # Voice events arrive as soon as the gateway connects, before on_ready starts the
+        # tracker's tasks, so the tracker has to exist from the start to record those sessions
+        self.voice_tracker = VoiceTracker(self)
     
     def initialize_rate_limiters(self):
         """Initialize rate limiters for different bot subsystems"""
@@ -200,10 +204,6 @@ async def initialize_services(bot):
     root_logger.info("Starting image processor...")
     await start_image_processor(bot)
     
-    # Initialize avatar cache
-    root_logger.info("Initializing avatar cache...")
-    avatar_cache.start_cleanup_task(bot.loop)
-    
     # Preload image templates in background thread
     root_logger.info("Preloading image templates...")
     bot.loop.run_in_executor(
@@ -233,9 +233,6 @@ async def initialize_services(bot):
 def setup_event_handlers(bot):
     """Register all event handlers"""
     root_logger.info("Setting up event handlers...")
-    # Replace this import with one that will get the quest-aware handler
-    from modules.quest_integration import voice_handler_with_quests
-    
     @bot.event
     async def on_ready():
         """Called when the bot has successfully connected to Discord"""
@@ -302,12 +299,13 @@ def setup_event_handlers(bot):
         if member.bot:
             return
             
-        channel_before = before.channel.name if before.channel else "None"
-        channel_after = after.channel.name if after.channel else "None"
-        root_logger.info(f"Voice state update: {member.name} moved from {channel_before} to {channel_after}")
+        if root_logger.isEnabledFor(logging.INFO):
+            channel_before = before.channel.name if before.channel else "None"
+            channel_after = after.channel.name if after.channel else "None"
+            root_logger.info(f"Voice state update: {member.name} moved from {channel_before} to {channel_after}")
         
-        # Use the quest-aware handler which will also call the original one
-        await voice_handler_with_quests(bot, member, before, after)
+        # Voice quests are handled by the quest cog's own listener
+        await bot.voice_tracker.handle_voice_state_update(member, before, after)
 
     @bot.event
     async def on_reaction_add(reaction, user):
@@ -779,6 +777,16 @@ async def cleanup_resources(bot):
     root_logger.info("Executing graceful shutdown sequence...")
     print("Executing graceful shutdown sequence...")
     
+    # Stop voice tracking tasks; the XP writer flushes queued awards while the database is still open
+    if hasattr(bot, 'voice_tracker'):
+        root_logger.info("Stopping voice tracking tasks...")
+        await bot.voice_tracker.stop()
+    
+    # Stop quest system after voice tracking, whose last XP flush can still queue quest progress
+    if hasattr(bot, 'quest_manager'):
+        root_logger.info("Stopping quest system...")
+        await bot.quest_manager.stop()
+    
     # Cancel any running background tasks
     for task in asyncio.all_tasks(asyncio.get_event_loop()):
         if task != asyncio.current_task():
@@ -807,15 +815,7 @@ async def cleanup_resources(bot):
     if hasattr(bot, 'session') and not bot.session.closed:
         root_logger.info("Closing HTTP sessions...")
         await bot.session.close()
-    
-    # Stop quest system
-    if hasattr(bot, 'quest_manager'):
-        root_logger.info("Stopping quest system...")
-        await bot.quest_manager.stop()
-
-    # Stop periodic processing
-    stop_periodic_processing()
-    root_logger.info("Stopping periodic processing...")
+    await close_session()
     
     # Stop performance monitoring
     stop_monitoring()
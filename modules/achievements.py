@@ -12,10 +12,7 @@ from database import (
     get_level_up_channel,
     get_achievement_channel,
 )
-# Import the existing voice_sessions from voice_activity.
-from modules.voice_activity import voice_sessions
-
-# We'll use a key in each session to track the last time we awarded achievements.
+# We'll use a field in each session to track the last time we awarded achievements.
 # If not present, we fall back to the session's "state_start_time".
 
 async def send_achievement_notification(guild, member, achievement_data):
@@ -155,11 +152,11 @@ async def process_voice_time_achievement(guild_id, user_id, seconds, member):
             
     return completed_achievements
 
-async def voice_state_update_achievement_listener(member, before, after):
+async def voice_state_update_achievement_listener(bot, member, before, after):
     """
     Listener for on_voice_state_update events to process voice time achievements.
     
-    This listener uses the existing voice_sessions data. When a user leaves or switches channels,
+    This listener uses the voice tracker's existing session data. When a user leaves or switches channels,
     if a session start time is available in voice_sessions, it computes the session duration and updates achievements.
     """
     if member.bot:
@@ -170,19 +167,20 @@ async def voice_state_update_achievement_listener(member, before, after):
 
     # When a user leaves or switches channels:
     if before.channel and (not after.channel or before.channel != after.channel):
-        session_info = voice_sessions.get(user_id)
-        if session_info and session_info.get("state_start_time"):
-            session_start = session_info["state_start_time"]
+        session_info = bot.voice_tracker.sessions.get(member.id)
+        if session_info:
+            session_start = session_info.state_start_time
             session_end = time.time()
             session_duration = int(session_end - session_start)
-            logging.info(f"{session_end} | {session_start}")
-            logging.info(f"{member.name} left voice channel {before.channel.name} after {session_duration} seconds")
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(f"{session_end} | {session_start}")
+                logging.info(f"{member.name} left voice channel {before.channel.name} after {session_duration} seconds")
             
             await process_voice_time_achievement(guild_id, user_id, session_duration, member)
             
-            # Remove the session info from voice_sessions if desired.
+            # Remove the session info from the voice tracker if desired.
             # Note: If voice_activity.py manages cleanup, be cautious here.
-            # voice_sessions.pop(user_id, None)
+            # bot.voice_tracker.remove_session(member.id)
 
 async def periodic_voice_achievement_update(bot):
     """
@@ -194,21 +192,26 @@ async def periodic_voice_achievement_update(bot):
     await bot.wait_until_ready()
     while not bot.is_closed():
         current_time = datetime.utcnow().timestamp()
-        # Iterate over a copy of the current sessions.
-        for user_id, session in list(voice_sessions.items()):
+        # Collect the due updates first; the live sessions can't be iterated across awaits.
+        due_updates = []
+        for user_id, session in bot.voice_tracker.sessions.items():
             # Ensure that we have a start time and a reference to the member.
-            state_start = session.get("state_start_time")
-            member = session.get("member")
+            state_start = session.state_start_time
+            member = session.member
             if not state_start or not member:
                 continue
-            # Use a separate key to track the last update; if not set, default to state_start.
-            last_update = session.get("last_achievement_update", state_start)
+            # Use a separate field to track the last update; if not set, default to state_start.
+            last_update = session.last_achievement_update or state_start
             elapsed = int(current_time - last_update)
             if elapsed >= 60:  # update every minute
-                guild_id = str(member.guild.id)
+                due_updates.append((user_id, session, member, elapsed))
+        
+        for user_id, session, member, elapsed in due_updates:
+            guild_id = str(session.guild_id)
+            if logging.getLogger().isEnabledFor(logging.INFO):
                 logging.info(f"Periodic update for {member.name}: awarding {elapsed} seconds of voice time")
-                await process_voice_time_achievement(guild_id, user_id, elapsed, member)
-                session["last_achievement_update"] = current_time
+            await process_voice_time_achievement(guild_id, str(user_id), elapsed, member)
+            session.last_achievement_update = current_time
         await asyncio.sleep(60)
 
 def register_achievement_hooks(bot):
@@ -219,7 +222,9 @@ def register_achievement_hooks(bot):
     the core voice tracking and achievement processing can coexist.
     Also wraps message, reaction, and command events.
     """
-    bot.add_listener(voice_state_update_achievement_listener, "on_voice_state_update")
+    async def on_voice_state_update(member, before, after):
+        await voice_state_update_achievement_listener(bot, member, before, after)
+    bot.add_listener(on_voice_state_update, "on_voice_state_update")
     
     original_on_message = getattr(bot, "on_message", None)
     async def on_message(message):
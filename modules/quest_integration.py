@@ -2,372 +2,575 @@
 Quest system integration with bot events and background tasks.
 """
 import discord
+from discord.ext import commands
 import asyncio
+import functools
 import logging
 import random
+import time
 from datetime import datetime, timedelta
-from discord.ext import tasks
+from types import MappingProxyType
 
 from config import load_config, QUEST_SETTINGS
 from database import (
-    get_guild_active_quests,
+    get_guilds_without_active_quests,
+    get_guild_active_requirement_types,
     mark_quests_inactive,
-    check_quest_progress,
-    award_quest_rewards,
+    update_and_check_batch,
+    award_quest_rewards_bulk,
     get_user_active_quests,
-    create_quest,
+    create_quest_for_guilds,
+    create_quests_bulk,
     get_quest_channel,
     get_level_up_channel,
     get_quest_cooldowns,
     get_quest_reset_settings
 )
 
-# Import original handler at module level
-from modules.voice_activity import handle_voice_state_update as original_voice_handler
+from modules.voice_activity import get_session_active_seconds
+from utils.rate_limiter import RateLimiter
 
-# ===== QUEST INTEGRATION FUNCTIONS =====
+# Counter batching settings
+COUNTER_FLUSH_INTERVAL = 2.0  # seconds to collect increments before writing them
+COUNTER_FLUSH_SIZE = 500  # flush early once this many (guild, user, counter) keys are pending
+COUNTER_QUEUE_SIZE = 10000
+COUNTER_STOP_TIMEOUT = 10  # seconds to wait for the final counter flush on shutdown
 
-async def handle_message_quests(message, bot):
-    """Handle quest progress for messages"""
-    # Ignore messages from bots
-    if message.author.bot:
-        return
+# Maximum number of guilds reset or initialized concurrently
+RESET_CONCURRENCY = 32
+INIT_CONCURRENCY = 16
+
+# Generator for quest rotations, reseeded per guild and cycle
+_RNG = random.Random()
+
+# Activity counter increments waiting to be written: (guild_id, user_id, counter, delta, member, channel)
+counter_queue = asyncio.Queue(maxsize=COUNTER_QUEUE_SIZE)
+# Queued by QuestManager.stop() behind the last increment; the batch writer flushes and exits
+_COUNTER_STOP = object()
+_counter_stopping = False
+
+# Completion notification settings
+NOTIFICATION_QUEUE_SIZE = 1000
+NOTIFICATION_WORKERS = 4  # concurrent channel.send calls
+NOTIFICATION_MAX_ATTEMPTS = 3  # sends per notification when rate limited
+NOTIFICATION_RETRY_DELAY = 5.0  # seconds, multiplied by the attempt number
+
+# Completion notifications waiting to be sent: (channel, member, quest, attempt)
+notification_queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+
+# Resolved quest notification channel per guild: {guild_id: channel_id}
+_notify_channel_cache = {}
+CHANNEL_SETTING_TTL = 300  # seconds to reuse a guild's configured quest/level-up channel
+
+# Completion embed per quest, without the user-specific description/thumbnail: {quest_id: embed}
+EMBED_TEMPLATE_CACHE_SIZE = 1000
+_embed_template_cache = {}
+
+# Daily quest templates (read-only, shared by every guild's rotation). Keys match the
+# create_quest parameters so templates can be unpacked straight into the insert calls
+_DAILY_QUEST_TEMPLATES = (
+    MappingProxyType({
+        "name": "Daily Messenger",
+        "description": "Send messages in any channel",
+        "quest_type": "daily",
+        "requirement_type": "total_messages",
+        "requirement_value": 10,
+        "reward_xp": 100,
+        "difficulty": "easy",
+        "refresh_cycle": "daily"
+    }),
+    MappingProxyType({
+        "name": "Daily Reactor",
+        "description": "Add reactions to messages",
+        "quest_type": "daily",
+        "requirement_type": "total_reactions",
+        "requirement_value": 5,
+        "reward_xp": 75,
+        "difficulty": "easy",
+        "refresh_cycle": "daily"
+    }),
+    MappingProxyType({
+        "name": "Daily Voice",
+        "description": "Spend time in voice channels",
+        "quest_type": "daily",
+        "requirement_type": "voice_time_seconds",
+        "requirement_value": 5 * 60,  # 5 minutes in seconds
+        "reward_xp": 150,
+        "difficulty": "medium",
+        "refresh_cycle": "daily"
+    }),
+    MappingProxyType({
+        "name": "Daily Commander",
+        "description": "Use bot commands",
+        "quest_type": "daily",
+        "requirement_type": "commands_used",
+        "requirement_value": 3,
+        "reward_xp": 50,
+        "difficulty": "easy",
+        "refresh_cycle": "daily"
+    }),
+)
+
+# Weekly quest templates
+_WEEKLY_QUEST_TEMPLATES = (
+    MappingProxyType({
+        "name": "Weekly Communicator",
+        "description": "Send messages throughout the week",
+        "quest_type": "weekly",
+        "requirement_type": "total_messages",
+        "requirement_value": 50,
+        "reward_xp": 500,
+        "difficulty": "medium",
+        "refresh_cycle": "weekly"
+    }),
+    MappingProxyType({
+        "name": "Weekly Engager",
+        "description": "React to lots of messages",
+        "quest_type": "weekly",
+        "requirement_type": "total_reactions",
+        "requirement_value": 20,
+        "reward_xp": 250,
+        "difficulty": "easy",
+        "refresh_cycle": "weekly"
+    }),
+    MappingProxyType({
+        "name": "Weekly Voice Chatter",
+        "description": "Spend time in voice channels with friends",
+        "quest_type": "weekly",
+        "requirement_type": "voice_time_seconds",
+        "requirement_value": 30 * 60,  # 30 minutes in seconds
+        "reward_xp": 750,
+        "difficulty": "hard",
+        "refresh_cycle": "weekly"
+    }),
+    MappingProxyType({
+        "name": "Weekly Commander",
+        "description": "Make good use of bot commands",
+        "quest_type": "weekly",
+        "requirement_type": "commands_used",
+        "requirement_value": 10,
+        "reward_xp": 300,
+        "difficulty": "medium",
+        "refresh_cycle": "weekly"
+    }),
+)
 
-    # Only handle messages in guild channels
-    if not message.guild:
+# Special quests, created once per guild
+_SPECIAL_QUESTS = (
+    MappingProxyType({
+        "name": "Voice Veteran",
+        "description": "Spend a total of 10 hours in voice channels",
+        "quest_type": "special",
+        "requirement_type": "voice_time_seconds",
+        "requirement_value": 10 * 60 * 60,  # 10 hours in seconds
+        "reward_xp": 2000,
+        "difficulty": "hard",
+        "refresh_cycle": "once"
+    }),
+    MappingProxyType({
+        "name": "Reaction Master",
+        "description": "Add 100 reactions to messages",
+        "quest_type": "special",
+        "requirement_type": "total_reactions",
+        "requirement_value": 100,
+        "reward_xp": 500,
+        "difficulty": "medium",
+        "refresh_cycle": "once"
+    }),
+    MappingProxyType({
+        "name": "Message Milestone",
+        "description": "Send 1000 messages in the server",
+        "quest_type": "special",
+        "requirement_type": "total_messages",
+        "requirement_value": 1000,
+        "reward_xp": 1500,
+        "difficulty": "hard",
+        "refresh_cycle": "once"
+    }),
+    MappingProxyType({
+        "name": "Command Connoisseur",
+        "description": "Use 50 different bot commands",
+        "quest_type": "special",
+        "requirement_type": "commands_used",
+        "requirement_value": 50,
+        "reward_xp": 1000,
+        "difficulty": "medium",
+        "refresh_cycle": "once"
+    }),
+)
+
+# ===== COUNTER BATCHING =====
+
+async def queue_counter_update(guild_id, user_id, counter, delta, member, channel=None):
+    """
+    Queue an activity counter increment for the batch writer.
+    
+    member and channel are kept so rewards and notifications can be sent once the
+    batch is written; channel may be None to skip the notification.
+    """
+    if _counter_stopping:
+        logging.warning(f"Quest counter writer stopping, dropping {counter} increment for user {user_id} in guild {guild_id}")
         return
+    
+    item = (guild_id, user_id, counter, delta, member, channel)
+    try:
+        counter_queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # Apply backpressure instead of dropping progress
+        logging.warning("Quest counter queue is full, waiting for the batch writer")
+        await counter_queue.put(item)
+
+async def counter_batch_processor():
+    """Background task that merges queued counter increments and writes them in batches"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    
+    while not stopping:
+        # {(guild_id, user_id, counter): [delta, member, channel]}
+        pending = {}
+        
+        # Wait for the first increment, then collect more until the interval or size limit
+        item = await counter_queue.get()
+        if item is _COUNTER_STOP:
+            break
+        deadline = loop.time() + COUNTER_FLUSH_INTERVAL
+        
+        while True:
+            guild_id, user_id, counter, delta, member, channel = item
+            key = (guild_id, user_id, counter)
+            if key in pending:
+                pending[key][0] += delta
+                pending[key][1] = member
+                pending[key][2] = channel or pending[key][2]
+            else:
+                pending[key] = [delta, member, channel]
+            
+            if len(pending) >= COUNTER_FLUSH_SIZE:
+                break
+            
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            
+            try:
+                item = await asyncio.wait_for(counter_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _COUNTER_STOP:
+                stopping = True
+                break
+        
+        try:
+            await flush_counter_batch(pending)
+        except Exception as e:
+            logging.error(f"Error flushing quest counter batch: {e}", exc_info=True)
 
-    guild_id = str(message.guild.id)
-    user_id = str(message.author.id)
+async def drain_counter_queue(task):
+    """Stop accepting increments and wait for the batch writer to flush what is queued"""
+    global _counter_stopping
+    _counter_stopping = True
+    # New increments are refused from here on, so the sentinel is the last item
+    await counter_queue.put(_COUNTER_STOP)
+    # Shielded so a timeout in the caller leaves the decision to cancel the writer to it
+    await asyncio.shield(task)
+
+async def flush_counter_batch(pending):
+    """Write merged counter increments (one statement per counter type) and award completed quests"""
+    by_counter = {}
+    for (guild_id, user_id, counter), (delta, member, channel) in pending.items():
+        by_counter.setdefault(counter, []).append((guild_id, user_id, delta))
+    
+    for counter, entries in by_counter.items():
+        results = await update_and_check_batch(counter, entries)
+        logging.debug(f"Flushed {len(entries)} {counter} increments")
+        
+        for (guild_id, user_id), (new_value, newly_completed) in results.items():
+            if not newly_completed:
+                continue
+            
+            _, member, channel = pending[(guild_id, user_id, counter)]
+            
+            # Award all of this user's completed quests with one XP update
+            try:
+                awarded_ids = await award_quest_rewards_bulk(
+                    guild_id, user_id, [quest['id'] for quest in newly_completed], member
+                )
+            except Exception as e:
+                logging.error(f"Error awarding quest rewards: {e}")
+                continue
+            
+            if channel:
+                for quest in newly_completed:
+                    if quest['id'] in awarded_ids:
+                        queue_quest_notification(channel, member, quest)
+
+def queue_quest_notification(channel, member, quest, attempt=0):
+    """
+    Hand a completion notification to the notification workers.
+    
+    Sending happens in the background so a slow or rate-limited channel.send
+    doesn't hold up the counter writer. If the queue is full the notification is
+    dropped; the rewards have already been awarded.
+    """
+    try:
+        notification_queue.put_nowait((channel, member, quest, attempt))
+    except asyncio.QueueFull:
+        logging.warning(f"Quest notification queue is full, dropping notification for quest '{quest['name']}'")
+
+async def notification_worker():
+    """Background task that sends queued quest completion notifications"""
+    while True:
+        channel, member, quest, attempt = await notification_queue.get()
+        try:
+            await send_quest_completion_notification(channel, member, quest)
+        except discord.HTTPException as e:
+            # Only rate limits get here; back off, then requeue a limited number of times
+            if attempt + 1 < NOTIFICATION_MAX_ATTEMPTS:
+                await asyncio.sleep(NOTIFICATION_RETRY_DELAY * (attempt + 1))
+                queue_quest_notification(channel, member, quest, attempt + 1)
+            else:
+                logging.warning(f"Giving up on quest completion notification after {attempt + 1} attempts: {e}")
+        except Exception as e:
+            logging.error(f"Error sending quest completion notification: {e}", exc_info=True)
+        finally:
+            notification_queue.task_done()
+
+# ===== QUEST INTEGRATION FUNCTIONS =====
+
+# Short name per activity counter, used for rate limiter keys and names
+_COUNTER_KINDS = {
+    "total_messages": "message",
+    "total_reactions": "reaction",
+    "commands_used": "command",
+    "voice_time_seconds": "voice",
+}
+
+async def _process_activity(bot, guild_id, actor, counter, delta, channel):
+    """
+    Count one activity towards a guild's quests.
+    
+    Skips counters no active quest uses, applies the global quest rate limiter and
+    the guild's per-counter cooldown, then queues the increment for the batch
+    writer. channel is where a completion notification may be sent (None to skip).
+    Returns True if the increment was queued.
+    """
+    # Skip the rate limiters and counter write when no active quest tracks this counter
+    if counter not in await get_guild_active_requirement_types(guild_id):
+        return False
+    
+    user_id = str(actor.id)
+    kind = _COUNTER_KINDS[counter]
     
     # Check rate limiting for quest progress
-    quest_key = f"quest:message:{user_id}"
+    quest_key = f"quest:{kind}:{user_id}"
     is_limited, wait_time = await bot.rate_limiters["quest"].check_rate_limit(quest_key)
     
-    # Additional cooldown specific to message quests
-    message_quest_key = f"quest_message:{user_id}"
-    # Get server-specific cooldown settings
+    # Additional cooldown specific to this counter, from the server's settings
     quest_cooldowns = await get_quest_cooldowns(guild_id)
-    cooldown = quest_cooldowns.get("total_messages", QUEST_SETTINGS["COOLDOWNS"]["total_messages"])
-    is_message_limited = False
+    cooldown = quest_cooldowns.get(counter, QUEST_SETTINGS["COOLDOWNS"][counter])
+    is_cooldown_limited = False
     
     if cooldown > 0:
         # Create a custom limiter for this specific quest type with the configured cooldown
-        if not hasattr(bot, "_message_quest_limiter"):
-            bot._message_quest_limiter = {}
+        limiter_attr = f"_{kind}_quest_limiter"
+        if not hasattr(bot, limiter_attr):
+            setattr(bot, limiter_attr, {})
+        limiters = getattr(bot, limiter_attr)
         
-        if guild_id not in bot._message_quest_limiter:
-            from utils.rate_limiter import RateLimiter
-            bot._message_quest_limiter[guild_id] = RateLimiter(max_calls=1, period=cooldown, name="message_quest")
+        if guild_id not in limiters:
+            limiters[guild_id] = RateLimiter(max_calls=1, period=cooldown, name=f"{kind}_quest")
             
-        is_message_limited, _ = await bot._message_quest_limiter[guild_id].check_rate_limit(user_id)
+        is_cooldown_limited, _ = await limiters[guild_id].check_rate_limit(user_id)
     
     # If either limiter is triggered, skip quest progress
-    if is_limited or is_message_limited:
+    if is_limited or is_cooldown_limited:
         if is_limited:
-            logging.debug(f"Message quest rate limited for user {user_id}, try again in {wait_time}s")
+            logging.debug(f"{kind.capitalize()} quest rate limited for user {user_id}, try again in {wait_time}s")
         else:
-            logging.debug(f"Message quest cooldown active for user {user_id}")
-        return
-    
-    # Update total_messages counter and check for completed quests
-    from database import update_activity_counter_db
-    new_value, _ = await update_activity_counter_db(guild_id, user_id, "total_messages", 1)
+            logging.debug(f"{kind.capitalize()} quest cooldown active for user {user_id}")
+        return False
     
-    # Check quest progress with new counter value
-    newly_completed = await check_quest_progress(
-        guild_id, user_id, "total_messages", new_value
-    )
+    # Queue the increment; quests are checked when the batch is written
+    await queue_counter_update(guild_id, user_id, counter, delta, actor, channel)
+    return True
+
+async def handle_message_quests(message, bot):
+    """Handle quest progress for messages"""
+    if message.author.bot or not message.guild:
+        return
     
-    # Award rewards for completed quests
-    for quest in newly_completed:
-        await award_quest_rewards(guild_id, user_id, quest['id'], message.author)
-        await send_quest_completion_notification(message.channel, message.author, quest)
+    await _process_activity(bot, str(message.guild.id), message.author, "total_messages", 1, message.channel)
 
 async def handle_reaction_quests(reaction, user, bot):
     """Handle quest progress for reactions"""
     if user.bot or not reaction.message.guild:
         return
-        
-    guild_id = str(reaction.message.guild.id)
-    user_id = str(user.id)
     
-    # Check rate limiting for quest progress
-    quest_key = f"quest:reaction:{user_id}"
-    is_limited, wait_time = await bot.rate_limiters["quest"].check_rate_limit(quest_key)
-    
-    # Additional cooldown specific to reaction quests
-    reaction_quest_key = f"quest_reaction:{user_id}"
-    # Get server-specific cooldown settings
-    quest_cooldowns = await get_quest_cooldowns(guild_id)
-    cooldown = quest_cooldowns.get("total_reactions", QUEST_SETTINGS["COOLDOWNS"]["total_reactions"])
-    is_reaction_limited = False
-    
-    if cooldown > 0:
-        # Create a custom limiter for this specific quest type with the configured cooldown
-        if not hasattr(bot, "_reaction_quest_limiter"):
-            bot._reaction_quest_limiter = {}
-        
-        if guild_id not in bot._reaction_quest_limiter:
-            from utils.rate_limiter import RateLimiter
-            bot._reaction_quest_limiter[guild_id] = RateLimiter(max_calls=1, period=cooldown, name="reaction_quest")
-            
-        is_reaction_limited, _ = await bot._reaction_quest_limiter[guild_id].check_rate_limit(user_id)
-    
-    # If either limiter is triggered, skip quest progress
-    if is_limited or is_reaction_limited:
-        if is_limited:
-            logging.debug(f"Reaction quest rate limited for user {user_id}, try again in {wait_time}s")
-        else:
-            logging.debug(f"Reaction quest cooldown active for user {user_id}")
-        return
-    
-    # Update total_reactions counter and check for completed quests
-    from database import update_activity_counter_db
-    new_value, _ = await update_activity_counter_db(guild_id, user_id, "total_reactions", 1)
-    
-    # Check quest progress with new counter value
-    newly_completed = await check_quest_progress(
-        guild_id, user_id, "total_reactions", new_value
-    )
-    
-    # Award rewards for completed quests
-    for quest in newly_completed:
-        await award_quest_rewards(guild_id, user_id, quest['id'], user)
-        if hasattr(reaction.message.channel, "send"):
-            await send_quest_completion_notification(reaction.message.channel, user, quest)
+    await _process_activity(bot, str(reaction.message.guild.id), user, "total_reactions", 1, reaction.message.channel)
 
 async def handle_command_quests(ctx):
     """Handle quest progress for commands"""
     if ctx.author.bot or not ctx.guild:
         return
     
-    guild_id = str(ctx.guild.id)
-    user_id = str(ctx.author.id)
-    
-    # Check rate limiting for quest progress
-    quest_key = f"quest:command:{user_id}"
-    is_limited, wait_time = await ctx.bot.rate_limiters["quest"].check_rate_limit(quest_key)
-    
-    # Additional cooldown specific to command quests
-    command_quest_key = f"quest_command:{user_id}"
-    # Get server-specific cooldown settings
-    quest_cooldowns = await get_quest_cooldowns(guild_id)
-    cooldown = quest_cooldowns.get("commands_used", QUEST_SETTINGS["COOLDOWNS"]["commands_used"])
-    is_command_limited = False
-    
-    if cooldown > 0:
-        # Create a custom limiter for this specific quest type with the configured cooldown
-        if not hasattr(ctx.bot, "_command_quest_limiter"):
-            ctx.bot._command_quest_limiter = {}
-        
-        if guild_id not in ctx.bot._command_quest_limiter:
-            from utils.rate_limiter import RateLimiter
-            ctx.bot._command_quest_limiter[guild_id] = RateLimiter(max_calls=1, period=cooldown, name="command_quest")
-            
-        is_command_limited, _ = await ctx.bot._command_quest_limiter[guild_id].check_rate_limit(user_id)
-    
-    # If either limiter is triggered, skip quest progress
-    if is_limited or is_command_limited:
-        if is_limited:
-            logging.debug(f"Command quest rate limited for user {user_id}, try again in {wait_time}s")
-        else:
-            logging.debug(f"Command quest cooldown active for user {user_id}")
-        return
-    
-    # Update commands_used counter and check for completed quests
-    from database import update_activity_counter_db
-    new_value, _ = await update_activity_counter_db(guild_id, user_id, "commands_used", 1)
-    
-    # Check quest progress with new counter value
-    newly_completed = await check_quest_progress(
-        guild_id, user_id, "commands_used", new_value
-    )
-    
-    # Award rewards for completed quests
-    for quest in newly_completed:
-        await award_quest_rewards(guild_id, user_id, quest['id'], ctx.author)
-        await send_quest_completion_notification(ctx.channel, ctx.author, quest)
+    await _process_activity(ctx.bot, str(ctx.guild.id), ctx.author, "commands_used", 1, ctx.channel)
 
-async def handle_voice_quests(guild_id, user_id, seconds, member):
-    """Handle quest progress for voice activity"""
+async def handle_voice_quests(guild_id, user_id, seconds, member, channel=None):
+    """
+    Handle quest progress for voice activity
+    
+    channel is the voice channel the time was spent in; completion notifications
+    are sent to the guild's notification channel resolved from it.
+    """
     if seconds <= 0 or not member or member.bot:
         logging.debug(f"Skipping voice quest - invalid input: seconds={seconds}, member={member}")
         return
     
-    logging.info(f"Processing voice quests for {member.name}: {seconds} seconds")
-    
     try:
-        # Check rate limiting for quest progress
-        quest_key = f"quest:voice:{user_id}"
-        
-        # Make sure bot is accessible
-        try:
-            # Get bot instance from the member's client
-            bot = member._state._get_client()
-            is_limited, wait_time = await bot.rate_limiters["quest"].check_rate_limit(quest_key)
-            logging.debug(f"Voice quest rate limit check: is_limited={is_limited}, wait_time={wait_time}")
-        except Exception as e:
-            logging.error(f"Error getting bot or rate limiter: {e}")
-            is_limited = False
-            wait_time = 0
-        
-        # Additional cooldown specific to voice quests
-        from database import get_quest_cooldowns
-        from database.core import get_connection
-        try:
-            quest_cooldowns = await get_quest_cooldowns(guild_id)
-            logging.debug(f"Voice quest cooldown settings: {quest_cooldowns}")
-        except Exception as e:
-            logging.error(f"Error getting quest cooldowns: {e}")
-            quest_cooldowns = {}
-        
-        # Default to 0 if the specific cooldown isn't found
-        from config import QUEST_SETTINGS
-        cooldown = quest_cooldowns.get("voice_time_seconds", QUEST_SETTINGS["COOLDOWNS"]["voice_time_seconds"])
-        
-        is_voice_limited = False
-        
-        if cooldown > 0:
-            try:
-                # Create a custom limiter for this specific quest type with the configured cooldown
-                if not hasattr(bot, "_voice_quest_limiter"):
-                    bot._voice_quest_limiter = {}
-                
-                if guild_id not in bot._voice_quest_limiter:
-                    from utils.rate_limiter import RateLimiter
-                    bot._voice_quest_limiter[guild_id] = RateLimiter(max_calls=1, period=cooldown, name="voice_quest")
-                    
-                is_voice_limited, _ = await bot._voice_quest_limiter[guild_id].check_rate_limit(user_id)
-            except Exception as e:
-                logging.error(f"Error checking voice quest rate limit: {e}")
-                is_voice_limited = False
-        
-        # If either limiter is triggered, skip quest progress
-        if is_limited or is_voice_limited:
-            if is_limited:
-                logging.debug(f"Voice quest rate limited (global) for user {user_id}, try again in {wait_time}s")
-            else:
-                logging.debug(f"Voice quest cooldown active (specific) for user {user_id}")
-            return
-        
-        # Get current voice time from the database
-        current_seconds = 0
-        try:
-            async with get_connection() as conn:
-                query = """
-                SELECT voice_time_seconds 
-                FROM levels
-                WHERE guild_id = $1 AND user_id = $2
-                """
-                current_seconds = await conn.fetchval(query, guild_id, user_id) or 0
-                logging.debug(f"Current voice time before update: {current_seconds} seconds")
-        except Exception as e:
-            logging.error(f"Error getting current voice time: {e}")
-        
-        # Calculate new total value
-        new_total = current_seconds + seconds
+        # Get bot instance from the member's client
+        bot = member._state._get_client()
         
-        # Update voice_time_seconds counter and check for completed quests
-        from database import update_activity_counter_db, check_quest_progress
-        
-        try:
-            # First update the counter in levels table - pass the increment value (seconds), not the total
-            new_value, _ = await update_activity_counter_db(guild_id, user_id, "voice_time_seconds", seconds)
-            logging.info(f"Updated voice_time_seconds for {member.name}: new total={new_value} seconds")
-            
-            # Then check for quest progress, passing the session value to ensure daily/weekly quests only track new time
-            newly_completed = await check_quest_progress(
-                guild_id, user_id, "voice_time_seconds", new_value, seconds
-            )
-            
-            if newly_completed:
-                logging.info(f"User {member.name} completed {len(newly_completed)} voice quests: {[q['name'] for q in newly_completed]}")
-                
-                # Award rewards for completed quests
-                for quest in newly_completed:
-                    from database import award_quest_rewards, get_quest_channel, get_level_up_channel
-                    
-                    try:
-                        await award_quest_rewards(guild_id, user_id, quest['id'], member)
-                        logging.info(f"Awarded rewards for quest '{quest['name']}' to {member.name}")
-                        
-                        # Get the voice channel the member is in
-                        voice_channel = member.voice.channel if member.voice else None
-                        if voice_channel:
-                            await send_quest_completion_notification(voice_channel, member, quest)
-                            logging.info(f"Sent quest completion notification for '{quest['name']}' to {member.name}")
-                    except Exception as e:
-                        logging.error(f"Error awarding quest rewards or sending notification: {e}")
-            else:
-                logging.debug(f"No quests completed for {member.name} from voice activity")
-        except Exception as e:
-            logging.error(f"Error updating counter or checking quest progress: {e}", exc_info=True)
-            return
+        # Queue the session's seconds (the increment, not the total) so daily/weekly quests only track new time
+        if await _process_activity(bot, guild_id, member, "voice_time_seconds", seconds, channel):
+            logging.info(f"Queued {seconds} seconds of voice time for {member.name}")
     except Exception as e:
         logging.error(f"Error processing voice quest data: {e}", exc_info=True)
 
 async def send_quest_completion_notification(channel, user, quest):
     """Send a notification when a quest is completed"""
-    embed = discord.Embed(
+    # Resolve the avatar once; display_avatar falls back to the default avatar
+    avatar_url = user.display_avatar.url if QUEST_SETTINGS["NOTIFY_WITH_AVATAR"] else None
+    
+    embed = get_completion_embed_template(quest).copy()
+    embed.description = f"{user.mention} has completed a quest!"
+    
+    if avatar_url:
+        embed.set_thumbnail(url=avatar_url)
+    
+    notify_channel = await resolve_notify_channel(channel.guild)
+    if not notify_channel:
+        return
+    
+    try:
+        await notify_channel.send(embed=embed)
+    except discord.Forbidden:
+        # The bot can't post in the notification channel; nothing to retry
+        pass
+    except discord.HTTPException as e:
+        # Rate limits are retried by the notification workers
+        if e.status == 429:
+            raise
+        logging.warning(f"Failed to send quest completion notification: {e}")
+
+def get_completion_embed_template(quest):
+    """
+    Get the completion embed for a quest, building it on first use.
+    
+    The template holds the title, color and quest fields only; callers must copy()
+    it before filling in the user-specific description and thumbnail.
+    """
+    template = _embed_template_cache.get(quest['id'])
+    if template is not None:
+        return template
+    
+    template = discord.Embed(
         title="🎯 Quest Completed!",
-        description=f"{user.mention} has completed a quest!",
         color=discord.Color.gold()
     )
     
-    embed.add_field(name="Quest", value=quest['name'], inline=False)
-    embed.add_field(name="Reward", value=f"{quest['reward_xp']} XP", inline=True)
+    template.add_field(name="Quest", value=quest['name'], inline=False)
+    template.add_field(name="Reward", value=f"{quest['reward_xp']} XP", inline=True)
     
     if 'reward_multiplier' in quest and quest['reward_multiplier'] > 1.0:
-        embed.add_field(
+        template.add_field(
             name="Bonus", 
             value=f"{quest['reward_multiplier']}x XP multiplier", 
             inline=True
         )
     
-    if user.avatar:
-        embed.set_thumbnail(url=user.avatar.url)
-    
-    try:
-        # Try to get quest channel first
-        quest_channel_id = await get_quest_channel(str(channel.guild.id))
+    # Quests rotate daily, so drop the oldest templates rather than growing forever
+    if len(_embed_template_cache) >= EMBED_TEMPLATE_CACHE_SIZE:
+        del _embed_template_cache[next(iter(_embed_template_cache))]
+    _embed_template_cache[quest['id']] = template
+    return template
+
+def invalidate_quest_embed(quest_id):
+    """Drop the cached completion embed for a quest after it is edited or deleted"""
+    _embed_template_cache.pop(quest_id, None)
+
+def async_ttl_cache(ttl):
+    """
+    Memoize a single-argument coroutine function for ttl seconds per argument.
+    
+    Unlike the database config cache, None results are cached too, so a guild
+    without a configured channel doesn't query on every call. The wrapper gets an
+    invalidate(key) method for when the underlying setting changes.
+    """
+    def decorator(func):
+        cache = {}  # {key: (value, timestamp)}
+        
+        @functools.wraps(func)
+        async def wrapper(key):
+            entry = cache.get(key)
+            if entry is not None and time.time() - entry[1] < ttl:
+                return entry[0]
+            
+            value = await func(key)
+            cache[key] = (value, time.time())
+            return value
         
-        if quest_channel_id:
-            quest_channel = channel.guild.get_channel(int(quest_channel_id))
-            if quest_channel:
-                await quest_channel.send(embed=embed)
-            else:
-                # If quest channel not found, fall back to level up channel
-                level_up_channel_id = await get_level_up_channel(str(channel.guild.id))
-                if level_up_channel_id:
-                    level_channel = channel.guild.get_channel(int(level_up_channel_id))
-                    if level_channel:
-                        await level_channel.send(embed=embed)
-                    else:
-                        # If level up channel not found, fall back to system channel
-                        if channel.guild.system_channel:
-                            await channel.guild.system_channel.send(embed=embed)
-                else:
-                    # If no level up channel set, use system channel
-                    if channel.guild.system_channel:
-                        await channel.guild.system_channel.send(embed=embed)
-        else:
-            # If no quest channel set, try level up channel
-            level_up_channel_id = await get_level_up_channel(str(channel.guild.id))
-            if level_up_channel_id:
-                level_channel = channel.guild.get_channel(int(level_up_channel_id))
-                if level_channel:
-                    await level_channel.send(embed=embed)
-                else:
-                    # If level up channel not found, fall back to system channel
-                    if channel.guild.system_channel:
-                        await channel.guild.system_channel.send(embed=embed)
-            else:
-                # If no level up channel set, use system channel
-                if channel.guild.system_channel:
-                    await channel.guild.system_channel.send(embed=embed)
-    except Exception as e:
-        logging.error(f"Failed to send quest completion notification: {e}")
+        wrapper.invalidate = lambda key: cache.pop(key, None)
+        return wrapper
+    return decorator
+
+@async_ttl_cache(ttl=CHANNEL_SETTING_TTL)
+async def _quest_channel(guild_id):
+    return await get_quest_channel(guild_id)
+
+@async_ttl_cache(ttl=CHANNEL_SETTING_TTL)
+async def _level_channel(guild_id):
+    return await get_level_up_channel(guild_id)
+
+async def resolve_notify_channel(guild):
+    """
+    Resolve the channel quest notifications go to for a guild.
+    
+    Tries the quest channel, then the level-up channel, then the system channel.
+    The resolved channel ID is cached per guild, so the configured-channel lookups
+    only run on a cache miss or when the cached channel no longer exists.
+    """
+    guild_id = str(guild.id)
+    
+    channel_id = _notify_channel_cache.get(guild_id)
+    if channel_id is not None:
+        channel = guild.get_channel(channel_id)
+        if channel:
+            return channel
+        del _notify_channel_cache[guild_id]
+    
+    quest_channel_id, level_up_channel_id = await asyncio.gather(
+        _quest_channel(guild_id),
+        _level_channel(guild_id)
+    )
+    
+    candidates = [
+        guild.get_channel(int(configured_id))
+        for configured_id in (quest_channel_id, level_up_channel_id)
+        if configured_id
+    ]
+    candidates.append(guild.system_channel)
+    
+    channel = next((candidate for candidate in candidates if candidate), None)
+    if channel:
+        _notify_channel_cache[guild_id] = channel.id
+    return channel
+
+def invalidate_notify_channel(guild_id):
+    """Forget the resolved notification channel after a guild's channel settings change"""
+    guild_id = str(guild_id)
+    _notify_channel_cache.pop(guild_id, None)
+    _quest_channel.invalidate(guild_id)
+    _level_channel.invalidate(guild_id)
 
 # ===== QUEST LIFECYCLE MANAGEMENT =====
 
@@ -378,317 +581,306 @@ class QuestManager:
         self.bot = bot
         self.daily_reset_time = 0  # Default hour of day for daily reset (UTC)
         self.weekly_reset_day = 0  # Default day of week for weekly reset (0 = Monday)
+        self.counter_task = None  # Background task writing batched counter updates
+        self.notification_tasks = []  # Background tasks sending completion notifications
+        self.reset_task = None  # Background task sleeping until the next reset hour
+        self._reschedule_event = asyncio.Event()
+        self._last_reset_run = None
         
     def start(self):
         """Start all background tasks"""
-        self.check_quest_resets.start()
+        self.reset_task = asyncio.create_task(self._reset_scheduler())
         logging.info("Started quest reset background task")
         
-    def stop(self):
-        """Stop all background tasks"""
-        if self.check_quest_resets.is_running():
-            self.check_quest_resets.cancel()
+        global _counter_stopping
+        _counter_stopping = False
+        self.counter_task = asyncio.create_task(counter_batch_processor())
+        logging.info("Started quest counter batch writer")
+        
+        self.notification_tasks = [asyncio.create_task(notification_worker()) for _ in range(NOTIFICATION_WORKERS)]
+        logging.info(f"Started {NOTIFICATION_WORKERS} quest notification workers")
+        
+    async def stop(self, timeout=COUNTER_STOP_TIMEOUT):
+        """Stop all background tasks, flushing queued counter increments first"""
+        if self.reset_task and not self.reset_task.done():
+            self.reset_task.cancel()
             logging.info("Stopped quest reset background task")
-    
-    @tasks.loop(hours=1)
-    async def check_quest_resets(self):
-        """Check if it's time to reset daily or weekly quests for each guild"""
-        now = datetime.utcnow()
         
-        # Process each guild separately since they might have different reset times
-        for guild in self.bot.guilds:
-            guild_id = str(guild.id)
-            
-            # Get guild-specific reset settings
-            reset_hour, reset_day = await get_quest_reset_settings(guild_id)
-            
-            # Check for daily reset
-            if now.hour == reset_hour:
-                logging.info(f"Performing daily quest reset for guild {guild.name} ({guild_id})")
-                await self.reset_daily_quests_for_guild(guild_id, guild.name)
-            
-            # Check for weekly reset (on specific day and time)
-            if now.weekday() == reset_day and now.hour == reset_hour:
-                logging.info(f"Performing weekly quest reset for guild {guild.name} ({guild_id})")
-                await self.reset_weekly_quests_for_guild(guild_id, guild.name)
-    
-    @check_quest_resets.before_loop
-    async def before_check_quest_resets(self):
-        """Wait until the bot is ready before starting the loop"""
+        if self.counter_task and not self.counter_task.done():
+            # Let the writer finish its batch and drain the queue into a final flush
+            try:
+                await asyncio.wait_for(drain_counter_queue(self.counter_task), timeout=timeout)
+                logging.info("Stopped quest counter batch writer")
+            except asyncio.TimeoutError:
+                logging.warning(f"Quest counter writer did not finish flushing within {timeout} seconds, cancelling")
+                self.counter_task.cancel()
+        self.counter_task = None
+        
+        # Unsent notifications are dropped with the workers; their rewards are already awarded
+        for task in self.notification_tasks:
+            task.cancel()
+        self.notification_tasks = []
+    
+    def reschedule_resets(self):
+        """Wake the reset scheduler so it recomputes its next run, e.g. after a reset hour changes"""
+        self._reschedule_event.set()
+    
+    async def _get_reset_settings(self):
+        """Get {guild_id: (reset_hour, reset_day)} for every guild the bot is in"""
+        guild_ids = [str(guild.id) for guild in self.bot.guilds]
+        semaphore = asyncio.Semaphore(RESET_CONCURRENCY)
+        
+        async def fetch(guild_id):
+            async with semaphore:
+                return await get_quest_reset_settings(guild_id)
+        
+        settings = await asyncio.gather(*(fetch(guild_id) for guild_id in guild_ids))
+        return dict(zip(guild_ids, settings))
+    
+    @staticmethod
+    def _next_reset_time(after, reset_hours):
+        """Get the first whole hour strictly after `after` that is a reset hour for some guild"""
+        next_run = after.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        if not reset_hours:
+            return next_run
+        
+        hours_ahead = min((hour - next_run.hour) % 24 for hour in reset_hours)
+        return next_run + timedelta(hours=hours_ahead)
+    
+    async def _reset_scheduler(self):
+        """Sleep until the next hour any guild resets at, then run the resets that are due"""
         await self.bot.wait_until_ready()
         
-        # Calculate time until next hour to sync with clock
-        now = datetime.utcnow()
-        next_hour = (now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
-        wait_seconds = (next_hour - now).total_seconds()
-        
-        # Wait until the next hour exactly
-        await asyncio.sleep(wait_seconds)
+        while True:
+            try:
+                self._reschedule_event.clear()
+                reset_settings = await self._get_reset_settings()
+                
+                now = datetime.utcnow()
+                after = max(now, self._last_reset_run) if self._last_reset_run else now
+                next_run = self._next_reset_time(after, {hour for hour, _ in reset_settings.values()})
+                
+                try:
+                    # Reset hours can change (or guilds join) while sleeping; recompute if so
+                    await asyncio.wait_for(self._reschedule_event.wait(), (next_run - now).total_seconds())
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+                
+                self._last_reset_run = next_run
+                await self.check_quest_resets(next_run)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Error in quest reset scheduler: {e}")
+                await asyncio.sleep(60)
+    
+    async def check_quest_resets(self, run_time):
+        """Reset daily or weekly quests for each guild whose reset falls on run_time"""
+        daily_due = []
+        weekly_due = []
+        
+        # Guilds might have different reset times, so collect the ones due this hour
+        reset_settings = await self._get_reset_settings()
+        for guild_id, (reset_hour, reset_day) in reset_settings.items():
+            if run_time.hour != reset_hour:
+                continue
+            
+            logging.info(f"Performing daily quest reset for guild {guild_id}")
+            daily_due.append(guild_id)
+            
+            # Weekly reset happens on a specific day at the same hour
+            if run_time.weekday() == reset_day:
+                logging.info(f"Performing weekly quest reset for guild {guild_id}")
+                weekly_due.append(guild_id)
+        
+        if daily_due:
+            await self.reset_daily_quests_for_guilds(daily_due)
+        if weekly_due:
+            await self.reset_weekly_quests_for_guilds(weekly_due)
+    
+    async def deactivate_quests_for_guilds(self, guild_ids, quest_type):
+        """
+        Mark a quest type inactive in several guilds concurrently.
+        
+        At most RESET_CONCURRENCY guilds are in flight at once so a reset across
+        thousands of guilds doesn't exhaust the connection pool.
+        Returns the IDs of the guilds that were reset.
+        """
+        semaphore = asyncio.Semaphore(RESET_CONCURRENCY)
+        
+        async def deactivate(guild_id):
+            async with semaphore:
+                try:
+                    await mark_quests_inactive(guild_id, quest_type)
+                    logging.info(f"{quest_type.capitalize()} quests reset for guild {guild_id}")
+                    return guild_id
+                except Exception as e:
+                    logging.error(f"Error in {quest_type} quest reset for guild {guild_id}: {e}")
+                    return None
+        
+        results = await asyncio.gather(*(deactivate(guild_id) for guild_id in guild_ids))
+        return [guild_id for guild_id in results if guild_id is not None]
     
     async def reset_daily_quests(self):
         """Reset daily quests across all guilds"""
         try:
-            # Reset each guild's daily quests
-            for guild in self.bot.guilds:
-                guild_id = str(guild.id)
-                await self.reset_daily_quests_for_guild(guild_id, guild.name)
-                
+            await self.reset_daily_quests_for_guilds([str(guild.id) for guild in self.bot.guilds])
         except Exception as e:
             logging.error(f"Error in daily quest reset: {e}")
     
     async def reset_daily_quests_for_guild(self, guild_id, guild_name=None):
         """Reset daily quests for a specific guild"""
+        await self.reset_daily_quests_for_guilds([guild_id])
+    
+    async def reset_daily_quests_for_guilds(self, guild_ids):
+        """Reset daily quests for several guilds, creating the new quests in bulk"""
+        # Mark old daily quests as inactive
+        reset_ids = await self.deactivate_quests_for_guilds(guild_ids, "daily")
+        
         try:
-            # Mark old daily quests as inactive
-            await mark_quests_inactive(guild_id, "daily")
-            guild_name = guild_name or guild_id
-            logging.info(f"Daily quests reset for guild {guild_name} ({guild_id})")
-            
             # Auto-create new daily quests if enabled
-            await self.create_daily_quests(guild_id)
-                
+            await self.create_daily_quests_for_guilds(reset_ids)
         except Exception as e:
-            logging.error(f"Error in daily quest reset for guild {guild_id}: {e}")
+            logging.error(f"Error creating daily quests during reset: {e}")
     
     async def reset_weekly_quests(self):
         """Reset weekly quests across all guilds"""
         try:
-            # Reset each guild's weekly quests
-            for guild in self.bot.guilds:
-                guild_id = str(guild.id)
-                await self.reset_weekly_quests_for_guild(guild_id, guild.name)
-                
+            await self.reset_weekly_quests_for_guilds([str(guild.id) for guild in self.bot.guilds])
         except Exception as e:
             logging.error(f"Error in weekly quest reset: {e}")
     
     async def reset_weekly_quests_for_guild(self, guild_id, guild_name=None):
         """Reset weekly quests for a specific guild"""
+        await self.reset_weekly_quests_for_guilds([guild_id])
+    
+    async def reset_weekly_quests_for_guilds(self, guild_ids):
+        """Reset weekly quests for several guilds, creating the new quests in bulk"""
+        # Mark old weekly quests as inactive
+        reset_ids = await self.deactivate_quests_for_guilds(guild_ids, "weekly")
+        
         try:
-            # Mark old weekly quests as inactive
-            await mark_quests_inactive(guild_id, "weekly")
-            guild_name = guild_name or guild_id
-            logging.info(f"Weekly quests reset for guild {guild_name} ({guild_id})")
-            
             # Auto-create new weekly quests if enabled
-            await self.create_weekly_quests(guild_id)
-                
+            await self.create_weekly_quests_for_guilds(reset_ids)
         except Exception as e:
-            logging.error(f"Error in weekly quest reset for guild {guild_id}: {e}")
+            logging.error(f"Error creating weekly quests during reset: {e}")
     
     async def create_daily_quests(self, guild_id):
         """Auto-create new daily quests for a guild"""
+        cycle = datetime.utcnow().date().toordinal()
+        await create_guild_rotation(guild_id, _DAILY_QUEST_TEMPLATES, cycle)
+    
+    async def create_daily_quests_for_guilds(self, guild_ids):
+        """Auto-create new daily quests for several guilds"""
         # This would be configured per guild
         # For now, just create some sample quests
         
-        # Daily quest templates
-        daily_quests = [
-            {
-                "name": "Daily Messenger",
-                "description": "Send messages in any channel",
-                "requirement_type": "total_messages",
-                "requirement_value": 10,
-                "reward_xp": 100,
-                "difficulty": "easy"
-            },
-            {
-                "name": "Daily Reactor",
-                "description": "Add reactions to messages",
-                "requirement_type": "total_reactions",
-                "requirement_value": 5,
-                "reward_xp": 75,
-                "difficulty": "easy"
-            },
-            {
-                "name": "Daily Voice",
-                "description": "Spend time in voice channels",
-                "requirement_type": "voice_time_seconds",
-                "requirement_value": 5 * 60,  # 5 minutes in seconds
-                "reward_xp": 150,
-                "difficulty": "medium"
-            },
-            {
-                "name": "Daily Commander",
-                "description": "Use bot commands",
-                "requirement_type": "commands_used",
-                "requirement_value": 3,
-                "reward_xp": 50,
-                "difficulty": "easy"
-            }
-        ]
-        
-        # Choose 2-3 random quests from the templates
-        num_quests = random.randint(2, 3)
-        selected_quests = random.sample(daily_quests, num_quests)
-        
-        for quest in selected_quests:
-            await create_quest(
-                guild_id=guild_id,
-                name=quest["name"],
-                description=quest["description"],
-                quest_type="daily",
-                requirement_type=quest["requirement_type"],
-                requirement_value=quest["requirement_value"],
-                reward_xp=quest["reward_xp"],
-                difficulty=quest["difficulty"],
-                refresh_cycle="daily"
-            )
-        
-        logging.info(f"Created {len(selected_quests)} daily quests for guild {guild_id}")
+        # One rotation per calendar day
+        cycle = datetime.utcnow().date().toordinal()
+        await create_rotated_quests(guild_ids, _DAILY_QUEST_TEMPLATES, "daily", cycle)
     
     async def create_weekly_quests(self, guild_id):
         """Auto-create new weekly quests for a guild"""
-        # Weekly quest templates
-        weekly_quests = [
-            {
-                "name": "Weekly Communicator",
-                "description": "Send messages throughout the week",
-                "requirement_type": "total_messages",
-                "requirement_value": 50,
-                "reward_xp": 500,
-                "difficulty": "medium"
-            },
-            {
-                "name": "Weekly Engager",
-                "description": "React to lots of messages",
-                "requirement_type": "total_reactions",
-                "requirement_value": 20,
-                "reward_xp": 250,
-                "difficulty": "easy"
-            },
-            {
-                "name": "Weekly Voice Chatter",
-                "description": "Spend time in voice channels with friends",
-                "requirement_type": "voice_time_seconds",
-                "requirement_value": 30 * 60,  # 30 minutes in seconds
-                "reward_xp": 750,
-                "difficulty": "hard"
-            },
-            {
-                "name": "Weekly Commander",
-                "description": "Make good use of bot commands",
-                "requirement_type": "commands_used",
-                "requirement_value": 10,
-                "reward_xp": 300,
-                "difficulty": "medium"
-            }
-        ]
-        
-        # Choose 2-3 random quests from the templates
-        num_quests = random.randint(2, 3)
-        selected_quests = random.sample(weekly_quests, num_quests)
-        
-        for quest in selected_quests:
-            await create_quest(
-                guild_id=guild_id,
-                name=quest["name"],
-                description=quest["description"],
-                quest_type="weekly",
-                requirement_type=quest["requirement_type"],
-                requirement_value=quest["requirement_value"],
-                reward_xp=quest["reward_xp"],
-                difficulty=quest["difficulty"],
-                refresh_cycle="weekly"
-            )
-        
-        logging.info(f"Created {len(selected_quests)} weekly quests for guild {guild_id}")
+        cycle = datetime.utcnow().date().toordinal() // 7
+        await create_guild_rotation(guild_id, _WEEKLY_QUEST_TEMPLATES, cycle)
+    
+    async def create_weekly_quests_for_guilds(self, guild_ids):
+        """Auto-create new weekly quests for several guilds"""
+        # One rotation per week
+        cycle = datetime.utcnow().date().toordinal() // 7
+        await create_rotated_quests(guild_ids, _WEEKLY_QUEST_TEMPLATES, "weekly", cycle)
+
+def select_quest_rotation(guild_id, templates, cycle):
+    """
+    Pick 2-3 quest templates for a guild and reset cycle.
+    
+    The RNG is seeded with the guild and cycle, so the same guild always gets the
+    same set for a given day/week (reproducible resets) and guilds that land on the
+    same template can be inserted together.
+    """
+    # Reseeding the shared generator avoids allocating a Random (and its state) per guild;
+    # this is synchronous, so no other caller can interleave between seed and sample
+    _RNG.seed(f"{guild_id}:{cycle}")
+    return _RNG.sample(range(len(templates)), _RNG.randint(2, 3))
+
+async def create_rotated_quests(guild_ids, templates, quest_type, cycle):
+    """Create each guild's rotation with one INSERT per template instead of one per guild"""
+    guilds_by_template = {}
+    for guild_id in guild_ids:
+        for index in select_quest_rotation(guild_id, templates, cycle):
+            guilds_by_template.setdefault(index, []).append(guild_id)
+    
+    for index, template_guild_ids in guilds_by_template.items():
+        await create_quest_for_guilds(guild_ids=template_guild_ids, **templates[index])
+    
+    logging.info(f"Created {quest_type} quests for {len(guild_ids)} guilds "
+                 f"using {len(guilds_by_template)} bulk inserts")
+
+async def create_guild_rotation(guild_id, templates, cycle):
+    """Create one guild's rotation with a single multi-row INSERT"""
+    # Templates already carry quest_type/refresh_cycle, so they are passed through as-is
+    quests = [templates[index] for index in select_quest_rotation(guild_id, templates, cycle)]
+    await create_quests_bulk(guild_id, quests)
 
 # ===== SETUP FUNCTIONS =====
 
-# Preserve the original voice handler but add quest processing
-async def voice_handler_with_quests(bot, member, before, after):
-    """Preserve the original voice handler but add quest processing"""
-    # Call the original handler first
-    await original_voice_handler(bot, member, before, after)
+class QuestCog(commands.Cog):
+    """Feeds bot events into quest progress"""
     
-    # If user is leaving a channel, process voice time for quests
-    if before.channel and not after.channel:
+    def __init__(self, bot):
+        self.bot = bot
+    
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        await handle_message_quests(message, self.bot)
+    
+    @commands.Cog.listener()
+    async def on_reaction_add(self, reaction, user):
+        await handle_reaction_quests(reaction, user, self.bot)
+    
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        await handle_command_quests(ctx)
+    
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        """Add a session's active voice time to voice quests when the user leaves"""
+        if member.bot or not before.channel or after.channel:
+            return
+        
         try:
-            logging.info(f"User {member.name} left voice channel {before.channel.name}, processing for quests")
-            
-            # Use voice_sessions from voice_activity to get session duration
-            from modules.voice_activity import voice_sessions
-            
             user_id = str(member.id)
-            guild_id = str(member.guild.id)
+            session = self.bot.voice_tracker.sessions.get(member.id)
+            if not session:
+                logging.warning(f"User {member.name} not found in voice sessions when leaving channel")
+                return
             
-            if user_id in voice_sessions:
-                logging.debug(f"Found voice session data for {member.name}")
-                
-                # Calculate session duration
-                if "state_history" in voice_sessions[user_id]:
-                    # Sum up all state durations
-                    total_seconds = 0
-                    states_summary = []
-                    
-                    for state in voice_sessions[user_id]["state_history"]:
-                        duration = state["end"] - state["start"]
-                        state_name = state["state"]
-                        
-                        # Log each state
-                        states_summary.append(f"{state_name}: {int(duration)}s")
-                        
-                        # Only count time when not muted/deafened
-                        if state_name in ["active", "streaming", "watching"]:
-                            total_seconds += duration
-                    
-                    logging.debug(f"Voice session states for {member.name}: {', '.join(states_summary)}")
-                    
-                    # Process voice time for quests
-                    if total_seconds > 0:
-                        logging.info(f"Processing {int(total_seconds)} seconds of active voice time for {member.name}")
-                        await handle_voice_quests(guild_id, user_id, int(total_seconds), member)
-                    else:
-                        logging.debug(f"No active voice time to process for {member.name} (user was muted/deafened)")
-                else:
-                    logging.warning(f"No state history for {member.name} in voice sessions")
+            # Counts the still-open period too, so this doesn't depend on the
+            # voice tracker's own listener having finalized the session first
+            total_seconds = int(get_session_active_seconds(session))
+            
+            if total_seconds > 0:
+                logging.info(f"Processing {total_seconds} seconds of active voice time for {member.name}")
+                await handle_voice_quests(str(member.guild.id), user_id, total_seconds, member, before.channel)
             else:
-                logging.warning(f"User {member.name} not found in voice sessions when leaving channel")
+                logging.debug(f"No active voice time to process for {member.name} (user was muted/deafened)")
         except Exception as e:
-            logging.error(f"Error in voice_handler_with_quests: {e}", exc_info=True)
+            logging.error(f"Error processing voice quests: {e}", exc_info=True)
+    
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        # A new guild may reset earlier than the hour the scheduler is sleeping until
+        if hasattr(self.bot, "quest_manager"):
+            self.bot.quest_manager.reschedule_resets()
 
-def register_quest_hooks(bot):
+async def register_quest_hooks(bot):
     """Register quest system hooks with the bot"""
     quest_manager = QuestManager(bot)
     bot.quest_manager = quest_manager
     
-    # Store the original event handlers
-    original_on_message = getattr(bot, "on_message", None)
-    original_on_reaction_add = getattr(bot, "on_reaction_add", None)
-    original_on_command_completion = getattr(bot, "on_command_completion", None)
-    
-    # Create new event handlers that include quest processing
-    async def on_message(message):
-        # Call the original handler first
-        if original_on_message:
-            await original_on_message(message)
-        
-        # Process message for quests
-        await handle_message_quests(message, bot)
-    
-    async def on_reaction_add(reaction, user):
-        # Call the original handler first
-        if original_on_reaction_add:
-            await original_on_reaction_add(reaction, user)
-        
-        # Process reaction for quests
-        await handle_reaction_quests(reaction, user, bot)
-    
-    async def on_command_completion(ctx):
-        # Call the original handler first
-        if original_on_command_completion:
-            await original_on_command_completion(ctx)
-        
-        # Process command for quests
-        await handle_command_quests(ctx)
-    
-    # Override the event handlers
-    bot.on_message = on_message
-    bot.on_reaction_add = on_reaction_add
-    bot.on_command_completion = on_command_completion
-    
-    # Update the voice handler in voice_activity module
-    from modules import voice_activity
-    voice_activity.handle_voice_state_update = voice_handler_with_quests
+    # Quest processing runs as cog listeners, dispatched alongside the bot's own handlers
+    await bot.add_cog(QuestCog(bot), override=True)
 
     # Start the quest manager
     quest_manager.start()
@@ -698,91 +890,42 @@ def register_quest_hooks(bot):
 
 async def create_special_quests(guild_id):
     """Create special quests that don't expire/reset automatically"""
-    special_quests = [
-        {
-            "name": "Voice Veteran",
-            "description": "Spend a total of 10 hours in voice channels",
-            "quest_type": "special",
-            "requirement_type": "voice_time_seconds",
-            "requirement_value": 10 * 60 * 60,  # 10 hours in seconds
-            "reward_xp": 2000,
-            "difficulty": "hard",
-            "refresh_cycle": "once"
-        },
-        {
-            "name": "Reaction Master",
-            "description": "Add 100 reactions to messages",
-            "quest_type": "special",
-            "requirement_type": "total_reactions",
-            "requirement_value": 100,
-            "reward_xp": 500,
-            "difficulty": "medium",
-            "refresh_cycle": "once"
-        },
-        {
-            "name": "Message Milestone",
-            "description": "Send 1000 messages in the server",
-            "quest_type": "special",
-            "requirement_type": "total_messages",
-            "requirement_value": 1000,
-            "reward_xp": 1500,
-            "difficulty": "hard",
-            "refresh_cycle": "once"
-        },
-        {
-            "name": "Command Connoisseur",
-            "description": "Use 50 different bot commands",
-            "quest_type": "special",
-            "requirement_type": "commands_used",
-            "requirement_value": 50,
-            "reward_xp": 1000,
-            "difficulty": "medium",
-            "refresh_cycle": "once"
-        }
-    ]
-    
-    # Create all special quests
-    for quest in special_quests:
-        await create_quest(
-            guild_id=guild_id,
-            name=quest["name"],
-            description=quest["description"],
-            quest_type=quest["quest_type"],
-            requirement_type=quest["requirement_type"],
-            requirement_value=quest["requirement_value"],
-            reward_xp=quest["reward_xp"],
-            difficulty=quest["difficulty"],
-            refresh_cycle=quest["refresh_cycle"]
-        )
+    # Create all special quests in one INSERT
+    await create_quests_bulk(guild_id, _SPECIAL_QUESTS)
     
-    logging.info(f"Created {len(special_quests)} special quests for guild {guild_id}")
+    logging.info(f"Created {len(_SPECIAL_QUESTS)} special quests for guild {guild_id}")
 
 async def initialize_guild_quests(bot):
     """Create initial quests for guilds if they don't have any"""
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        
-        # Check if guild has any active quests
-        active_quests = await get_guild_active_quests(guild_id)
-        
-        # If no active quests, create initial ones
-        if not active_quests:
-            logging.info(f"Creating initial quests for guild {guild.name} ({guild_id})")
-            
-            # Create daily quests
-            await bot.quest_manager.create_daily_quests(guild_id)
-            
-            # Create weekly quests
-            await bot.quest_manager.create_weekly_quests(guild_id)
-            
-            # Create some special quests
-            await create_special_quests(guild_id)
+    # One query finds every guild without active quests
+    guild_ids = await get_guilds_without_active_quests([str(guild.id) for guild in bot.guilds])
+    if not guild_ids:
+        return
+    
+    logging.info(f"Creating initial quests for {len(guild_ids)} guilds")
+    guild_ids = list(guild_ids)
+    
+    # Daily and weekly rotations are inserted in bulk across all the guilds
+    await bot.quest_manager.create_daily_quests_for_guilds(guild_ids)
+    await bot.quest_manager.create_weekly_quests_for_guilds(guild_ids)
+    
+    # Special quests are one INSERT per guild, run concurrently
+    semaphore = asyncio.Semaphore(INIT_CONCURRENCY)
+    
+    async def create_specials(guild_id):
+        async with semaphore:
+            try:
+                await create_special_quests(guild_id)
+            except Exception as e:
+                logging.error(f"Error creating special quests for guild {guild_id}: {e}")
+    
+    await asyncio.gather(*(create_specials(guild_id) for guild_id in guild_ids))
 
 async def start_quest_system(bot):
     """Initialize the quest system"""
     try:
         # Register event hooks first to create the quest manager
-        quest_manager = register_quest_hooks(bot)
+        quest_manager = await register_quest_hooks(bot)
         
         # Create initial quests for guilds if needed
         await initialize_guild_quests(bot)
@@ -1,753 +1,878 @@
 import time
+import bisect
+import heapq
+import itertools
 import logging
 import asyncio
+from enum import IntEnum
 
 import discord
-from discord.ext import tasks
 
 from config import load_config
 from utils.performance_monitoring import time_function
 from database import get_or_create_user_level, apply_channel_boost
-from modules.levels import award_xp_without_event_multiplier, send_level_up_notification, xp_to_next_level
+from modules.levels import send_level_up_notification, xp_to_next_level
+from modules.xp_writer import AsyncXPBatchWriter
+
+class VoiceState(IntEnum):
+    """Voice activity states, usable as indexes into XP_RATES"""
+    ACTIVE = 0
+    IDLE = 1
+    MUTED = 2
+    STREAMING = 3
+    WATCHING = 4
+
+    def __str__(self):
+        return self.name.lower()
 
 config = load_config()
-XP_RATES = config["XP_SETTINGS"]["RATES"]
+# XP per minute for each state, indexed by VoiceState
+XP_RATES = tuple(config["XP_SETTINGS"]["RATES"][str(state)] for state in VoiceState)
 IDLE_THRESHOLD = config["XP_SETTINGS"]["IDLE_THRESHOLD"]
 LONG_SESSION_THRESHOLD = 30 * 60  # 30 minutes - process sessions longer than this
 INACTIVE_SESSION_THRESHOLD = 3 * 60 * 60  # 3 hours - cleanup after this time
 PERIODIC_PROCESSING_INTERVAL = 15 * 60  # 15 minutes - how often to run processing
-MAX_STATE_HISTORY_ENTRIES = 100  # Maximum state history entries before compacting
+MAX_VOICE_SESSIONS = 100000  # Oldest sessions are evicted beyond this many
 
-# Enhanced tracking dictionaries
-voice_sessions = {}  # Detailed voice session tracking
-last_spoke = {}  # Last time a user was detected as speaking
-voice_channels = {}  # Track which channel a user is in
-stream_watchers = {}  # Track users who are watching streams
-last_processed = {}
+# Clock for durations that are never compared with stored timestamps (idle and processing
+# intervals). State periods stay on wall-clock time since they are matched against XP boost events
+_now = time.monotonic
 
-async def start_voice_tracking(bot):
-    """Start voice activity tracking tasks"""
-    check_idle_users.start(bot)
-    await start_periodic_processing(bot)  # Add this line
-    return True
+# Per-member and per-period log lines are only formatted when their level is enabled
+_log_enabled = logging.getLogger().isEnabledFor
+
+# States whose time counts towards voice quests and achievements (not muted/deafened or idle)
+_COUNTABLE_STATES = frozenset((VoiceState.ACTIVE, VoiceState.STREAMING, VoiceState.WATCHING))
+
+class StatePeriod:
+    """A closed period a user spent in one voice state and channel"""
+    __slots__ = ("state", "start", "end", "channel_id")
+    
+    def __init__(self, state, start, end, channel_id):
+        self.state = state
+        self.start = start
+        self.end = end
+        self.channel_id = channel_id
+
+class VoiceSession:
+    """Everything tracked for one user's voice session, kept in a single record"""
+    __slots__ = (
+        "guild_id", "channel_id", "member",
+        "current_state", "state_start_time", "state_history", "active_seconds",
+        "xp_settled",  # number of state_history periods whose XP has been awarded
+        "last_spoke",  # last time the user was detected as speaking (monotonic clock)
+        "idle_gen",  # generation of the user's pending idle check
+        "watching",  # whether the user is watching someone else's stream
+        "last_processed",  # last time process_long_voice_sessions awarded XP (monotonic clock)
+        "last_achievement_update",  # last time voice achievements were updated
+        "exit_processed", "ready_for_cleanup", "cleanup_time", "closed_at"
+    )
+
+    def __init__(self, guild_id, channel_id, member, state, start_time):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.member = member
+        self.current_state = state
+        self.state_start_time = start_time
+        self.state_history = []
+        self.active_seconds = 0
+        self.xp_settled = 0
+        self.last_spoke = _now()
+        self.idle_gen = None
+        self.watching = False
+        self.last_processed = None
+        self.last_achievement_update = None
+        self.exit_processed = False
+        self.ready_for_cleanup = False
+        self.cleanup_time = None
+        self.closed_at = None
+    
+    def transition_to(self, new_state, now):
+        """Close the current state period at now and start new_state from there"""
+        record_state_period(self, self.current_state, self.state_start_time, now, self.channel_id)
+        self.current_state = new_state
+        self.state_start_time = now
+
+# State for each (self_stream, muted or deafened) pair, indexed by self_stream << 1 | muted.
+# Streaming wins over muting; video doesn't change the state, it counts as active anyway
+_STATE_TABLE = (VoiceState.ACTIVE, VoiceState.MUTED, VoiceState.STREAMING, VoiceState.STREAMING)
 
 def determine_voice_state(voice_state):
-    """Determine if a user is active, muted, streaming, watching or idle based on voice state"""
-    # If the user is streaming, they're considered streaming
-    if getattr(voice_state, 'self_stream', False):
-        return "streaming"
-    
-    # If user is deafened or muted (either way), they're considered muted
-    if voice_state.self_mute or voice_state.mute or voice_state.self_deaf or voice_state.deaf:
-        return "muted"
+    """Determine if a user is active, muted or streaming based on voice state (watching and idle are set later)"""
+    muted = voice_state.self_mute or voice_state.mute or voice_state.self_deaf or voice_state.deaf
+    return _STATE_TABLE[voice_state.self_stream << 1 | muted]
+
+def record_state_period(session, state, start, end, channel_id):
+    """
+    Close a state period: add it to the session's history and, for countable
+    states, to the session's running active_seconds total.
     
-    # Consider video as active regardless of idle time
-    if getattr(voice_state, 'self_video', False):
-        return "active"
+    A period that continues the last one (same state and channel, starting where
+    it ended) extends it instead, as long as the last one hasn't been awarded yet.
+    This keeps histories compact as they grow rather than rescanning them later.
+    """
+    history = session.state_history
+    last = history[-1] if len(history) > session.xp_settled else None
+    if last and last.state == state and last.channel_id == channel_id and start <= last.end:
+        last.end = max(last.end, end)
+    else:
+        history.append(StatePeriod(state, start, end, channel_id))
     
-    # Default to active when joining (will be updated to "watching" if applicable)
-    return "active"
+    # A wall-clock step back can make a period negative; it adds nothing rather than subtracting
+    if state in _COUNTABLE_STATES and end > start:
+        session.active_seconds += end - start
 
-async def get_all_xp_boost_events_for_guild(guild_id):
+def get_session_active_seconds(session, current_time=None):
     """
-    Get all XP boost events for a guild (active, past, and future)
+    Get a session's countable voice time, including the state period that is still open.
     
-    Returns a list of events with start_time, end_time, and multiplier
+    Once the exit handler has closed the final period it is already part of
+    active_seconds, so this gives the same total whether it runs before or after
+    the exit handler for the same leave event.
     """
-    from database import get_active_xp_boost_events, get_upcoming_xp_boost_events
-    
-    # Get active events
-    active_events = await get_active_xp_boost_events(guild_id)
-    upcoming_events = await get_upcoming_xp_boost_events(guild_id)
+    total_seconds = session.active_seconds
+    if session.closed_at is None and session.current_state in _COUNTABLE_STATES:
+        total_seconds += (current_time or time.time()) - session.state_start_time
+    return total_seconds
+
+# In-flight XP boost event fetches by guild, shared by concurrent callers: {guild_id: (since, task)}
+_event_fetches = {}
+
+async def get_xp_boost_events_for_window(guild_id, start_time, end_time):
+    """
+    Get the XP boost events for a guild that overlap a time window, including ones
+    that have already ended
     
-    # Combine all events
-    all_events = active_events + upcoming_events
+    Returns a list of events with start_time, end_time, and multiplier. Concurrent
+    callers share a fetch whose window starts no later than theirs, so a burst of
+    voice exits doesn't send a query per exit when the event cache is cold.
+    """
+    from database import get_xp_boost_events_overlapping
     
-    return all_events
+    fetch = _event_fetches.get(guild_id)
+    if fetch is None or fetch[0] > start_time:
+        task = asyncio.create_task(get_xp_boost_events_overlapping(guild_id, start_time, float("inf")))
+        fetch = _event_fetches[guild_id] = (start_time, task)
+        
+        def forget_fetch(_):
+            if _event_fetches.get(guild_id) is fetch:
+                del _event_fetches[guild_id]
+        task.add_done_callback(forget_fetch)
+    
+    # Shielded so one caller being cancelled doesn't cancel the fetch for the others
+    events = await asyncio.shield(fetch[1])
+    return [event for event in events
+            if event["end_time"] > start_time and event["start_time"] < end_time]
 
-@time_function
-async def calculate_event_adjusted_xp(base_xp, start_time, end_time, events):
-    """Calculate XP with consideration for event multipliers during specific time periods"""
+class XPBoostEventIndex:
+    """
+    A guild's XP boost events swept into a timeline: the boundaries where the
+    effective multiplier changes and the multiplier in force between each pair.
+    Where events overlap the highest multiplier applies, and never less than 1.
+    """
+    __slots__ = ("bounds", "multipliers")
     
-    # If no events, return base XP
-    if not events:
-        return base_xp
+    def __init__(self, events):
+        bounds = sorted({time for event in events for time in (event["start_time"], event["end_time"])})
         
-    # Create time slices based on event boundaries
-    time_slices = []
-    
-    # Start with the whole period
-    current_slices = [{"start": start_time, "end": end_time, "multiplier": 1.0}]
-    
-    # Split each slice by each event
-    for event in events:
-        event_start = event["start_time"]
-        event_end = event["end_time"]
-        event_multiplier = event["multiplier"]
-        
-        new_slices = []
-        
-        for slice in current_slices:
-            slice_start = slice["start"]
-            slice_end = slice["end"]
-            slice_multiplier = slice["multiplier"]
-            
-            # Cases:
-            # 1. Event doesn't overlap with this slice
-            if event_end <= slice_start or event_start >= slice_end:
-                new_slices.append(slice)
-                continue
-                
-            # 2. Event completely covers this slice
-            if event_start <= slice_start and event_end >= slice_end:
-                new_slices.append({
-                    "start": slice_start,
-                    "end": slice_end,
-                    "multiplier": max(slice_multiplier, event_multiplier)
-                })
-                continue
-                
-            # 3. Event starts during this slice
-            if event_start > slice_start and event_start < slice_end:
-                # Add pre-event part
-                new_slices.append({
-                    "start": slice_start,
-                    "end": event_start,
-                    "multiplier": slice_multiplier
-                })
-                
-                # Add during-event part (if any)
-                if event_end < slice_end:
-                    new_slices.append({
-                        "start": event_start,
-                        "end": event_end,
-                        "multiplier": max(slice_multiplier, event_multiplier)
-                    })
-                    
-                    # Add post-event part
-                    new_slices.append({
-                        "start": event_end,
-                        "end": slice_end,
-                        "multiplier": slice_multiplier
-                    })
-                else:
-                    # Event extends beyond slice end
-                    new_slices.append({
-                        "start": event_start,
-                        "end": slice_end,
-                        "multiplier": max(slice_multiplier, event_multiplier)
-                    })
-                continue
-                
-            # 4. Event ends during this slice
-            if event_end > slice_start and event_end < slice_end:
-                # Add during-event part
-                new_slices.append({
-                    "start": slice_start,
-                    "end": event_end,
-                    "multiplier": max(slice_multiplier, event_multiplier)
-                })
-                
-                # Add post-event part
-                new_slices.append({
-                    "start": event_end,
-                    "end": slice_end,
-                    "multiplier": slice_multiplier
-                })
-        
-        current_slices = new_slices
-    
-    # Calculate total XP based on duration and multiplier for each slice
-    total_duration = end_time - start_time
-    total_xp = 0
-    
-    for slice in current_slices:
-        slice_duration = slice["end"] - slice["start"]
-        slice_fraction = slice_duration / total_duration
-        slice_xp = int(base_xp * slice_fraction * slice["multiplier"])
-        total_xp += slice_xp
-    
-    return total_xp
+        # Multiplier between each pair of boundaries, merging neighbours that end up equal
+        self.bounds = bounds[:1]
+        self.multipliers = []
+        for segment_start, segment_end in zip(bounds, bounds[1:]):
+            multiplier = max(
+                (event["multiplier"] for event in events
+                 if event["start_time"] <= segment_start and event["end_time"] >= segment_end),
+                default=1.0
+            )
+            multiplier = max(multiplier, 1.0)
+            if self.multipliers and self.multipliers[-1] == multiplier:
+                self.bounds[-1] = segment_end
+            else:
+                self.multipliers.append(multiplier)
+                self.bounds.append(segment_end)
+        
+        # Unboosted time at either end is the same as no event at all
+        while self.multipliers and self.multipliers[0] == 1.0:
+            del self.multipliers[0], self.bounds[0]
+        while self.multipliers and self.multipliers[-1] == 1.0:
+            del self.multipliers[-1], self.bounds[-1]
+        if not self.multipliers:
+            self.bounds = []
+    
+    def adjusted_xp(self, base_xp, start_time, end_time):
+        """
+        Calculate XP for a period with its event multipliers: the period is split where
+        the multiplier changes and each part earns its share of base_xp at its multiplier
+        """
+        bounds = self.bounds
+        first = bisect.bisect_right(bounds, start_time)
+        last = bisect.bisect_left(bounds, end_time)
+        
+        # The period doesn't cross a boundary: one multiplier covers it all
+        if first == last:
+            segment = first - 1
+            if 0 <= segment < len(self.multipliers):
+                return int(base_xp * self.multipliers[segment])
+            return base_xp
+        
+        cuts = [start_time, *bounds[first:last], end_time]
+        total_duration = end_time - start_time
+        total_xp = 0
+        for segment, part_start, part_end in zip(range(first - 1, last), cuts, cuts[1:]):
+            multiplier = self.multipliers[segment] if 0 <= segment < len(self.multipliers) else 1.0
+            total_xp += int(base_xp * (part_end - part_start) / total_duration * multiplier)
+        
+        return total_xp
 
-def update_stream_watchers(bot, channel, streamer_id=None):
+def calculate_period_xp(state, start_time, end_time, channel_id, event_index):
     """
-    Update the list of stream watchers in a channel.
-    If streamer_id is provided, it means a new stream started. Otherwise, check if anyone is streaming.
+    Calculate the XP for one state period: the state's per-minute rate for each
+    full minute, then the channel boost, then any XP boost events it overlaps
     """
-    if not channel:
-        return
+    duration_seconds = end_time - start_time
+    if duration_seconds < 60:
+        return 0
     
-    # Find streamers in the channel
-    streamers = []
-    if streamer_id:
-        streamers.append(streamer_id)
-    else:
-        for member in channel.members:
-            if member.voice and getattr(member.voice, 'self_stream', False):
-                streamers.append(str(member.id))
+    base_xp = int(duration_seconds // 60) * XP_RATES[state]
+    boosted_xp = apply_channel_boost(base_xp, str(channel_id))
     
-    # If there are streamers, mark other users as watchers
-    if streamers:
-        for member in channel.members:
-            user_id = str(member.id)
-            if user_id not in streamers and member.voice and not member.voice.self_deaf and not member.voice.deaf:
-                # Mark as a watcher if they're not streaming themselves and not deafened
-                if user_id in voice_sessions:
-                    # Record the end of the previous state
-                    current_time = time.time()
-                    previous_state = voice_sessions[user_id]["current_state"]
-                    state_start_time = voice_sessions[user_id]["state_start_time"]
-                    
-                    # Add previous state to history
-                    if "state_history" not in voice_sessions[user_id]:
-                        voice_sessions[user_id]["state_history"] = []
-                    
-                    voice_sessions[user_id]["state_history"].append({
-                        "state": previous_state,
-                        "start": state_start_time,
-                        "end": current_time,
-                        "channel_id": voice_sessions[user_id]["channel_id"]
-                    })
-                    
-                    # Update to watching state
-                    voice_sessions[user_id]["current_state"] = "watching"
-                    voice_sessions[user_id]["state_start_time"] = current_time
-                    logging.info(f"User {member.name} is now watching a stream")
-                
-                stream_watchers[user_id] = True
-    else:
-        # No streamers in channel, update anyone who was a watcher
-        for member in channel.members:
-            user_id = str(member.id)
-            if user_id in stream_watchers:
-                del stream_watchers[user_id]
-                
-                # Change state from watching to active if needed
-                if user_id in voice_sessions and voice_sessions[user_id]["current_state"] == "watching":
-                    current_time = time.time()
-                    
-                    # Record the end of the watching state
-                    if "state_history" not in voice_sessions[user_id]:
-                        voice_sessions[user_id]["state_history"] = []
-                    
-                    voice_sessions[user_id]["state_history"].append({
-                        "state": "watching",
-                        "start": voice_sessions[user_id]["state_start_time"],
-                        "end": current_time,
-                        "channel_id": voice_sessions[user_id]["channel_id"]
-                    })
-                    
-                    # Determine new state based on voice properties
-                    new_state = "active"
-                    if member.voice:
-                        if member.voice.self_mute or member.voice.mute or member.voice.self_deaf or member.voice.deaf:
-                            new_state = "muted"
-                    
-                    # Update to new state
-                    voice_sessions[user_id]["current_state"] = new_state
-                    voice_sessions[user_id]["state_start_time"] = current_time
-                    logging.info(f"User {member.name} is no longer watching a stream, now {new_state}")
+    return event_index.adjusted_xp(boosted_xp, start_time, end_time)
 
-@time_function
-async def handle_voice_channel_exit(guild_id, user_id, member):
-    """Process XP for a user leaving voice channel, considering their various states"""
-    if user_id not in voice_sessions:
-        return
-    
-    current_time = time.time()
-    
-    # Finalize current state by adding it to history
-    current_state = voice_sessions[user_id]["current_state"]
-    start_time = voice_sessions[user_id]["state_start_time"]
-    
-    # Make sure state_history exists
-    if "state_history" not in voice_sessions[user_id]:
-        voice_sessions[user_id]["state_history"] = []
-    
-    # Add current state to history
-    voice_sessions[user_id]["state_history"].append({
-        "state": current_state,
-        "start": start_time,
-        "end": current_time,
-        "channel_id": voice_sessions[user_id]["channel_id"]
-    })
+async def settle_session_xp(session, event_index=None):
+    """
+    Get the XP earned by the session's state periods that haven't been awarded yet,
+    and mark them awarded. Periods under a minute earn nothing, so when only those
+    are pending the guild's XP boost events aren't fetched.
     
-    # Get all XP boost events for this guild
-    all_events = await get_all_xp_boost_events_for_guild(guild_id)
+    Callers settling several sessions of one guild can pass the guild's event_index
+    so the events are fetched and indexed once for all of them.
+    """
+    history = session.state_history
+    # Claim the periods before awaiting so a concurrent settle can't award them twice
+    periods = history[session.xp_settled:]
+    session.xp_settled = len(history)
+    
+    earning_periods = [period for period in periods if period.end - period.start >= 60]
+    if not earning_periods:
+        return 0
+    
+    # Swept into a multiplier timeline once, then each period is a couple of bisects
+    if event_index is None:
+        events = await get_xp_boost_events_for_window(
+            str(session.guild_id),
+            min(period.start for period in earning_periods),
+            max(period.end for period in earning_periods)
+        )
+        event_index = XPBoostEventIndex(events)
     
-    # Calculate XP for each state period
     total_xp = 0
-    for state_period in voice_sessions[user_id]["state_history"]:
-        state = state_period["state"]
-        period_start = state_period["start"]
-        period_end = state_period["end"]
-        channel_id = state_period["channel_id"]
-        
-        # Calculate duration in minutes
-        duration_seconds = period_end - period_start
-        minutes_in_state = int(duration_seconds // 60)
-        
-        if minutes_in_state <= 0:
-            continue
-        
-        # Get the basic XP for this time
-        base_xp = minutes_in_state * XP_RATES[state]
-        
-        # Apply channel boost if channel_id is available
-        if channel_id:
-            boosted_xp = apply_channel_boost(base_xp, channel_id)
-            logging.info(f"Voice state {state} with channel boost: Base XP: {base_xp}, Boosted XP: {boosted_xp}, Channel: {channel_id}")
-        else:
-            boosted_xp = base_xp
-            logging.info(f"Voice state {state} without boost: {boosted_xp}")
-        
-        # Calculate event-adjusted XP for this period
-        period_xp = await calculate_event_adjusted_xp(
-            boosted_xp,
-            period_start,
-            period_end,
-            all_events
+    for state_period in earning_periods:
+        period_xp = calculate_period_xp(
+            state_period.state,
+            state_period.start,
+            state_period.end,
+            state_period.channel_id,
+            event_index
         )
         
-        total_xp += period_xp
-        logging.info(f"Added {period_xp} XP for {minutes_in_state} minutes in {state} state (after event adjustments)")
+        if period_xp > 0:
+            total_xp += period_xp
+            if _log_enabled(logging.INFO):
+                logging.info(f"Added {period_xp} XP for {state_period.state} state in channel {state_period.channel_id} (after boosts)")
     
-    # Award the total XP if any was earned
-    if total_xp > 0:
-        logging.info(f"Awarding total of {total_xp} XP to {member.name} for voice activity")
-        await award_xp_without_event_multiplier(guild_id, user_id, total_xp, member)
-    else:
-        logging.info(f"No XP awarded to {member.name} for voice activity (total_xp = {total_xp})")
-    
-    # Mark session as ready for cleanup, but keep data for quest processing
-    # IMPORTANT: Do not delete the session data here, as the quest system needs it
-    voice_sessions[user_id]["ready_for_cleanup"] = True
-    voice_sessions[user_id]["cleanup_time"] = current_time
-    voice_sessions[user_id]["exit_processed"] = True
-    
-    # Keep the data but remove user from active tracking systems
-    if user_id in stream_watchers:
-        del stream_watchers[user_id]
-    if user_id in last_spoke:
-        del last_spoke[user_id]
-    if user_id in voice_channels:
-        del voice_channels[user_id]
-
-@time_function(name="Voice_StateUpdate")
-async def handle_voice_state_update(bot, member, before, after):
-    """Handle voice state update events"""
-    guild_id = str(member.guild.id)
-    user_id = str(member.id)
-    current_time = time.time()
+    return total_xp
+
+class VoiceTracker:
+    """
+    Voice activity tracking state for one bot: the voice sessions, the per-channel
+    streamer sets, the pending idle checks, and the background tasks that act on them.
     
-    # User joins a voice channel
-    if after.channel and not before.channel:
-        voice_action_key = f"voice_join:{user_id}"
-        is_limited, _ = await bot.rate_limiters["voice_xp"].check_rate_limit(voice_action_key)
-        
-        if is_limited:
-            # Still track but log the rate limit
-            logging.info(f"Rate limited voice join for user {user_id}")
-            
-        # Store the channel id
-        voice_channels[user_id] = str(after.channel.id)
-        
-        # Initialize user's voice session
-        state = determine_voice_state(after)
-        voice_sessions[user_id] = {
-            "channel_id": str(after.channel.id),
-            "current_state": state,
-            "state_start_time": current_time,
-            "state_history": [],
-            "member": member,
-            "exit_processed": False
-        }
-        
-        # Initialize speaking timestamp
-        last_spoke[user_id] = current_time
-        
-        # Check if the user should be marked as watching a stream
-        if state != "streaming" and state != "muted":
-            # Check if there are any streamers in the channel
-            for member_in_channel in after.channel.members:
-                if member_in_channel.voice and getattr(member_in_channel.voice, 'self_stream', False):
-                    # There's at least one streamer, mark this user as watching
-                    voice_sessions[user_id]["current_state"] = "watching"
-                    stream_watchers[user_id] = True
-                    logging.info(f"User {member.name} joined and is now watching a stream")
-                    break
+    Created in the bot's setup_hook and registered as bot.voice_tracker; its
+    tasks are started by start_voice_tracking.
+    """
+    __slots__ = (
+        "bot",
+        "sessions",  # voice sessions by user id
+        "guild_sessions",  # the same sessions sharded by guild: {guild_id: {user_id: session}}
+        "channel_streamers",  # streaming user ids per voice channel: {channel_id: set(user_id)}
+        "idle_heap",  # pending idle checks: (due_time, generation, user_id)
+        "idle_gen",  # generation counter for idle checks
+        "idle_wakeup",  # set when a check is pushed ahead of the earliest one
+        "idle_task", "periodic_task",
+        "writer"  # batches the XP awarded for voice activity
+    )
+
+    def __init__(self, bot, writer=None):
+        self.bot = bot
+        self.sessions = {}
+        self.guild_sessions = {}
+        # A channel that isn't present hasn't been scanned yet; it is filled from
+        # channel.members on first use and kept current from voice state updates after that
+        self.channel_streamers = {}
+        # Only the entry whose generation matches the session's idle_gen is live;
+        # older ones are skipped when popped
+        self.idle_heap = []
+        self.idle_gen = itertools.count()
+        self.idle_wakeup = asyncio.Event()
+        self.idle_task = None
+        self.periodic_task = None
+        self.writer = writer or AsyncXPBatchWriter()
+
+    def start(self):
+        """Start the XP writer, idle checker and periodic processing tasks"""
+        self.writer.start()
+        if self.idle_task is None or self.idle_task.done():
+            self.idle_task = asyncio.create_task(self.check_idle_users())
+        if self.periodic_task is None or self.periodic_task.done():
+            self.periodic_task = asyncio.create_task(self.periodic_processing_loop())
+            logging.info("Started periodic voice session processing task")
+
+    async def stop(self):
+        """Stop the background tasks, then let the XP writer flush its queued awards"""
+        if self.idle_task:
+            self.idle_task.cancel()
+            self.idle_task = None
+        if self.periodic_task and not self.periodic_task.done():
+            self.periodic_task.cancel()
+            logging.info("Stopped periodic voice session processing task")
+        self.periodic_task = None
+        await self.writer.stop()
+
+    def add_session(self, user_id, session):
+        """Start tracking a voice session, replacing any earlier session of the user"""
+        self.remove_session(user_id)
+        sessions = self.sessions
         
-    # User leaves a voice channel
-    elif before.channel and not after.channel:
-        # Process accumulated XP with event awareness
-        await handle_voice_channel_exit(guild_id, user_id, member)
+        # Bound memory if leave events keep getting missed; dicts keep join order, so the first key is the oldest
+        while len(sessions) >= MAX_VOICE_SESSIONS:
+            oldest_user_id = next(iter(sessions))
+            logging.warning(f"Voice session limit of {MAX_VOICE_SESSIONS} reached, evicting session for user {oldest_user_id}")
+            self.remove_session(oldest_user_id)
+        sessions[user_id] = session
+        self.guild_sessions.setdefault(session.guild_id, {})[user_id] = session
+
+    def remove_session(self, user_id):
+        """Stop tracking a user's voice session"""
+        session = self.sessions.pop(user_id, None)
+        if session:
+            shard = self.guild_sessions.get(session.guild_id)
+            if shard is not None:
+                shard.pop(user_id, None)
+                if not shard:
+                    del self.guild_sessions[session.guild_id]
+
+    def schedule_idle_check(self, user_id, session):
+        """
+        Schedule the check that marks an active user idle once they have been silent for
+        IDLE_THRESHOLD. Replaces any check already pending for the user.
         
-        # If user was streaming, update watchers in the channel they left
-        if before.self_stream:
-            update_stream_watchers(bot, before.channel)
-    
-    # User changes voice state (mute/deafen/stream/etc.) but stays in a channel
-    elif after.channel and before.channel:
-        # Update channel if they moved to a different channel
-        if before.channel.id != after.channel.id:
-            if user_id in voice_sessions:
-                # Record the end of the state in the previous channel
-                previous_state = voice_sessions[user_id]["current_state"]
-                previous_start_time = voice_sessions[user_id]["state_start_time"]
-                previous_channel = voice_sessions[user_id]["channel_id"]
-                
-                # Add to state history
-                if "state_history" not in voice_sessions[user_id]:
-                    voice_sessions[user_id]["state_history"] = []
-                
-                voice_sessions[user_id]["state_history"].append({
-                    "state": previous_state,
-                    "start": previous_start_time,
-                    "end": current_time,
-                    "channel_id": previous_channel
-                })
-                
-                # Update channel
-                voice_sessions[user_id]["channel_id"] = str(after.channel.id)
-                voice_channels[user_id] = str(after.channel.id)
-                
-                # Reset state with new start time (state may be the same but we're in a new channel)
-                voice_sessions[user_id]["state_start_time"] = current_time
+        Active users always have one pending check. Speaking doesn't reschedule it; the
+        checker pushes it back to the new deadline when it comes due instead, so the
+        heap holds one live entry per active user however often they speak.
+        """
+        session.idle_gen = gen = next(self.idle_gen)
+        idle_heap = self.idle_heap
+        heapq.heappush(idle_heap, (session.last_spoke + IDLE_THRESHOLD, gen, user_id))
+        
+        # Wake the checker if this is now the earliest check
+        if idle_heap[0][1] == gen:
+            self.idle_wakeup.set()
+
+    def get_session_member(self, user_id):
+        """Get the member for a tracked voice session from the guild it was started in"""
+        session = self.sessions.get(user_id)
+        if not session:
+            return None
+        guild = self.bot.get_guild(session.guild_id)
+        return guild and guild.get_member(user_id)
+
+    def get_channel_streamers(self, channel):
+        """Get the ids of the users streaming in a voice channel"""
+        channel_id = channel.id
+        streamers = self.channel_streamers.get(channel_id)
+        if streamers is None:
+            streamers = self.channel_streamers[channel_id] = {
+                member.id for member in channel.members
+                if member.voice and member.voice.self_stream
+            }
+        return streamers
+
+    def update_channel_streamers(self, user_id, before, after):
+        """Move a user between the streamer sets of the channels in a voice state update"""
+        if before.channel and before.self_stream:
+            streamers = self.channel_streamers.get(before.channel.id)
+            if streamers is not None:
+                streamers.discard(user_id)
+        
+        if after.channel and after.self_stream:
+            streamers = self.channel_streamers.get(after.channel.id)
+            if streamers is not None:
+                streamers.add(user_id)
+
+    def update_stream_watchers(self, channel):
+        """
+        Update the stream watchers in a channel: if anyone is streaming, everyone else who
+        isn't deafened is watching; otherwise nobody is.
+        """
+        if not channel:
+            return
+        
+        streamers = self.get_channel_streamers(channel)
+        current_time = time.time()
+        
+        # One pass over the members: with streamers, mark other users as watchers;
+        # without, update anyone who was a watcher
+        for member in channel.members:
+            self.update_member_watching(member, streamers, current_time)
+
+    def update_member_watching(self, member, streamers, current_time):
+        """Update whether one member is watching a stream, given their channel's streamers"""
+        user_id = member.id
+        voice = member.voice
+        
+        if streamers:
+            # Mark as a watcher if they're not streaming themselves and not deafened;
+            # those are ruled out from the member alone before looking up the session
+            if user_id in streamers or not voice or voice.self_deaf or voice.deaf:
+                return
             
-            # If user was streaming and changed channels, update both channels
-            if before.self_stream:
-                update_stream_watchers(bot, before.channel)
+            # Already watching: leave the running period alone rather than splitting it
+            session = self.sessions.get(user_id)
+            if not session or (session.watching and session.current_state == VoiceState.WATCHING):
+                return
             
-            # Check streaming status in new channel
+            # Close the previous state and start watching
+            session.transition_to(VoiceState.WATCHING, current_time)
+            session.watching = True
+            if _log_enabled(logging.INFO):
+                logging.info(f"User {member.name} is now watching a stream")
+        
+        else:
+            # Without streamers only former watchers change
+            session = self.sessions.get(user_id)
+            if not session or not session.watching:
+                return
+            
+            session.watching = False
+            
+            # Change state from watching to active if needed
+            if session.current_state == VoiceState.WATCHING:
+                # Determine new state based on voice properties
+                new_state = VoiceState.ACTIVE
+                if voice and (voice.self_mute or voice.mute or voice.self_deaf or voice.deaf):
+                    new_state = VoiceState.MUTED
+                
+                # Close the watching state and update to the new one
+                session.transition_to(new_state, current_time)
+                if new_state == VoiceState.ACTIVE:
+                    self.schedule_idle_check(user_id, session)
+                if _log_enabled(logging.INFO):
+                    logging.info(f"User {member.name} is no longer watching a stream, now {new_state}")
+
+    def sync_channel_stream_state(self, member, before, after):
+        """
+        Update stream watchers after a user moves channels or starts/stops streaming,
+        passing over each affected channel at most once. Changes that can only
+        affect the user themselves update just the user.
+        """
+        before_channel = before.channel
+        after_channel = after.channel
+        
+        if before_channel.id != after_channel.id:
+            # A streamer leaving only changes watchers if nobody else there is streaming
+            if before.self_stream and not self.get_channel_streamers(before_channel):
+                self.update_stream_watchers(before_channel)
+            
+            # A streamer arriving makes the others watchers; anyone else arriving
+            # only decides whether they are watching themselves
             if after.self_stream:
-                update_stream_watchers(bot, after.channel, user_id)
+                self.update_stream_watchers(after_channel)
             else:
-                # Not streaming, check if should be watching someone else
-                update_stream_watchers(bot, after.channel)
+                self.update_member_watching(member, self.get_channel_streamers(after_channel), time.time())
         
-        # Check for stream start/stop
-        if before.self_stream != after.self_stream:
-            if after.self_stream:
-                # User started streaming
-                update_stream_watchers(bot, after.channel, user_id)
+        # Check for stream start/stop; stopping while others still stream only affects the user
+        elif before.self_stream != after.self_stream:
+            if after.self_stream or not self.get_channel_streamers(after_channel):
+                self.update_stream_watchers(after_channel)
             else:
-                # User stopped streaming
-                update_stream_watchers(bot, after.channel)
+                self.update_member_watching(member, self.get_channel_streamers(after_channel), time.time())
+
+    @time_function
+    async def handle_voice_channel_exit(self, guild_id, user_id, member):
+        """Process XP for a user leaving voice channel, considering their various states"""
+        session = self.sessions.get(user_id)
+        if not session:
+            return
+        
+        current_time = time.time()
+        
+        # Finalize current state by adding it to history
+        record_state_period(session, session.current_state, session.state_start_time, current_time,
+                            session.channel_id)
+        session.closed_at = current_time
+        
+        # Calculate event-aware XP for the periods not already awarded by periodic processing
+        total_xp = await settle_session_xp(session)
+        
+        # Award the total XP if any was earned
+        if total_xp > 0:
+            if _log_enabled(logging.INFO):
+                logging.info(f"Awarding total of {total_xp} XP to {member.name} for voice activity")
+            self.writer.submit(str(guild_id), str(user_id), total_xp, member)
+        elif _log_enabled(logging.INFO):
+            logging.info(f"No XP awarded to {member.name} for voice activity (total_xp = {total_xp})")
+        
+        # Mark session as ready for cleanup, but keep data for quest processing
+        # IMPORTANT: Do not delete the session data here, as the quest system needs it
+        session.ready_for_cleanup = True
+        session.cleanup_time = current_time
+        session.exit_processed = True
+        session.watching = False
+
+    @time_function(name="Voice_StateUpdate")
+    async def handle_voice_state_update(self, member, before, after):
+        """Handle voice state update events"""
+        guild_id = member.guild.id
+        user_id = member.id
+        before_channel = before.channel
+        after_channel = after.channel
+        current_time = time.time()
+        
+        after_channel_id = after_channel.id if after_channel else None
+        
+        # Keep the per-channel streamer sets current before anything reads them
+        self.update_channel_streamers(user_id, before, after)
+        
+        # User joins a voice channel
+        if after_channel and not before_channel:
+            voice_action_key = f"voice_join:{user_id}"
+            is_limited, _ = await self.bot.rate_limiters["voice_xp"].check_rate_limit(voice_action_key)
             
-        # Only process if it's a relevant state change
-        if (before.self_mute != after.self_mute or 
-            before.mute != after.mute or 
-            before.self_deaf != after.self_deaf or 
-            before.deaf != after.deaf or
-            before.self_stream != after.self_stream or
-            getattr(before, 'self_video', False) != getattr(after, 'self_video', False)):
+            if is_limited and _log_enabled(logging.INFO):
+                # Still track but log the rate limit
+                logging.info(f"Rate limited voice join for user {user_id}")
             
-            # State changed, record the previous state's duration
-            if user_id in voice_sessions:
-                previous_state = voice_sessions[user_id]["current_state"]
-                state_start_time = voice_sessions[user_id]["state_start_time"]
-                
-                # Add to state history
-                if "state_history" not in voice_sessions[user_id]:
-                    voice_sessions[user_id]["state_history"] = []
-                
-                voice_sessions[user_id]["state_history"].append({
-                    "state": previous_state,
-                    "start": state_start_time,
-                    "end": current_time,
-                    "channel_id": voice_sessions[user_id]["channel_id"]
-                })
+            # Initialize user's voice session (speaking timestamp starts at the join)
+            state = determine_voice_state(after)
+            session = VoiceSession(guild_id, after_channel_id, member, state, current_time)
+            self.add_session(user_id, session)
             
-                # Update to new state
-                new_state = determine_voice_state(after)
-                voice_sessions[user_id]["current_state"] = new_state
-                voice_sessions[user_id]["state_start_time"] = current_time
-                
-                # If user is now deafened, they can't be watching a stream
-                if new_state == "muted" and user_id in stream_watchers:
-                    del stream_watchers[user_id]
-
-async def handle_voice_speaking_update(member, speaking):
-    """Handle voice speaking update events"""
-    user_id = str(member.id)
-    current_time = time.time()
-    
-    if speaking:
-        # Update the last time this user spoke
-        last_spoke[user_id] = current_time
-        
-        # If they were idle, change state to active (but don't change if watching or streaming)
-        if user_id in voice_sessions and voice_sessions[user_id]["current_state"] == "idle":
-            # Record the idle state duration
-            if "state_history" not in voice_sessions[user_id]:
-                voice_sessions[user_id]["state_history"] = []
+            # Mark the user as watching if there's at least one streamer in the channel
+            if state == VoiceState.ACTIVE and self.get_channel_streamers(after_channel):
+                session.current_state = VoiceState.WATCHING
+                session.watching = True
+                if _log_enabled(logging.INFO):
+                    logging.info(f"User {member.name} joined and is now watching a stream")
+            elif state == VoiceState.ACTIVE:
+                self.schedule_idle_check(user_id, session)
+        
+        # User leaves a voice channel
+        elif before_channel and not after_channel:
+            # Process accumulated XP with event awareness
+            await self.handle_voice_channel_exit(guild_id, user_id, member)
             
-            voice_sessions[user_id]["state_history"].append({
-                "state": "idle",
-                "start": voice_sessions[user_id]["state_start_time"],
-                "end": current_time,
-                "channel_id": voice_sessions[user_id]["channel_id"]
-            })
+            # If user was the last streamer, update watchers in the channel they left
+            if before.self_stream and not self.get_channel_streamers(before_channel):
+                self.update_stream_watchers(before_channel)
+        
+        # User changes voice state (mute/deafen/stream/etc.) but stays in a channel
+        elif after_channel and before_channel:
+            session = self.sessions.get(user_id)
+            if session:
+                # Keep the member current for the paths that use it without a guild lookup
+                session.member = member
             
-            # Update to active state (only if not watching a stream)
-            if user_id not in stream_watchers:
-                voice_sessions[user_id]["current_state"] = "active"
-                voice_sessions[user_id]["state_start_time"] = current_time
-
-@tasks.loop(minutes=1)
-async def check_idle_users(bot):
-    """Check for users who have gone idle"""
-    current_time = time.time()
-    
-    for user_id, session in list(voice_sessions.items()):
-        # Skip users who are already idle, muted, streaming, or watching
-        if session["current_state"] in ["idle", "muted", "streaming", "watching"]:
-            continue
-        
-        # Check if user hasn't spoken in the threshold time
-        if user_id in last_spoke:
-            time_since_last_spoke = current_time - last_spoke[user_id]
+            # Update channel if they moved to a different channel
+            if before_channel.id != after_channel.id:
+                if session:
+                    # Close the state in the previous channel; it continues from now in the new one
+                    session.transition_to(session.current_state, current_time)
+                    session.channel_id = after_channel_id
             
-            if time_since_last_spoke > IDLE_THRESHOLD:
-                # Convert from active to idle
-                guild_id = None
-                member = None
-                
-                # Find the guild and member
-                for guild in bot.guilds:
-                    member = guild.get_member(int(user_id))
-                    if member:
-                        guild_id = str(guild.id)
-                        break
+            # Update watchers in the channels the move or stream start/stop affects
+            self.sync_channel_stream_state(member, before, after)
+            
+            # Only process if it's a relevant state change
+            if (before.self_mute != after.self_mute or
+                before.mute != after.mute or
+                before.self_deaf != after.self_deaf or
+                before.deaf != after.deaf or
+                before.self_stream != after.self_stream or
+                before.self_video != after.self_video):
                 
-                if guild_id and member:
-                    # Record the active state duration
-                    if "state_history" not in session:
-                        session["state_history"] = []
-                    
-                    session["state_history"].append({
-                        "state": "active",
-                        "start": session["state_start_time"],
-                        "end": current_time,
-                        "channel_id": session["channel_id"]
-                    })
+                # State changed, record the previous state's duration
+                if session:
+                    # Close the previous state and update to the new one
+                    new_state = determine_voice_state(after)
+                    session.transition_to(new_state, current_time)
+                    if new_state == VoiceState.ACTIVE:
+                        self.schedule_idle_check(user_id, session)
                     
-                    # Update to idle state
-                    session["current_state"] = "idle"
-                    session["state_start_time"] = current_time
-                    logging.info(f"User {member.display_name} is now idle after {time_since_last_spoke:.1f} seconds of inactivity")
+                    # If user is now deafened, they can't be watching a stream
+                    if new_state == VoiceState.MUTED:
+                        session.watching = False
 
-@tasks.loop(seconds=PERIODIC_PROCESSING_INTERVAL)
-async def periodic_voice_processing(bot):
-    """
-    Perform periodic processing of voice sessions
-    This includes processing long sessions and cleaning up inactive ones
-    """
-    try:
+    async def handle_voice_speaking_update(self, member, speaking):
+        """Handle voice speaking update events"""
+        user_id = member.id
+        session = self.sessions.get(user_id)
         current_time = time.time()
         
-        # Process any long-running voice sessions
-        await process_long_voice_sessions(bot, current_time)
-        
-        # Clean up inactive sessions
-        cleanup_inactive_sessions(current_time)
-        
-        # Compact large state histories to prevent memory growth
-        compact_large_histories()
-        
-        # Log memory stats periodically
-        total_sessions = len(voice_sessions)
-        total_channels = len(voice_channels)
-        total_watchers = len(stream_watchers)
-        total_speakers = len(last_spoke)
-        
-        logging.info(f"Voice tracking stats: {total_sessions} active sessions, "
-                   f"{total_channels} channel mappings, {total_watchers} stream watchers")
-                   
-        # Check for any potentially stale/orphaned sessions
-        stale_sessions = 0
-        for user_id, session in voice_sessions.items():
-            # Sessions without exit_processed flag might be orphaned
-            if not session.get("ready_for_cleanup", False) and current_time - session.get("state_start_time", 0) > 3600:
-                logging.warning(f"Potentially stale voice session for {user_id}, "
-                              f"active for {(current_time - session.get('state_start_time', 0)) / 60:.1f} minutes")
-                stale_sessions += 1
+        if speaking and session:
+            # Update the last time this user spoke; their pending idle check sees
+            # this when it comes due and is pushed back then
+            session.last_spoke = _now()
+            
+            # If they were idle, change state to active (but don't change if watching or streaming)
+            if session.current_state == VoiceState.IDLE:
+                # Update to active state (only if not watching a stream)
+                if not session.watching:
+                    session.transition_to(VoiceState.ACTIVE, current_time)
+                    self.schedule_idle_check(user_id, session)
+                else:
+                    # Record the idle state duration
+                    record_state_period(session, VoiceState.IDLE, session.state_start_time,
+                                        current_time, session.channel_id)
+
+    async def check_idle_users(self):
+        """Mark users idle as their idle checks come due, sleeping until the earliest one"""
+        idle_heap = self.idle_heap
+        idle_wakeup = self.idle_wakeup
+        sessions = self.sessions
+        
+        while True:
+            try:
+                now = _now()
                 
-                # If exceptionally old (over 6 hours), force cleanup
-                if current_time - session.get("state_start_time", 0) > 6 * 3600:
-                    logging.warning(f"Force cleaning very stale voice session for {user_id}")
-                    session["ready_for_cleanup"] = True
-                    session["cleanup_time"] = current_time
-                    session["exit_processed"] = True  # Mark as processed so it can be cleaned up
-        
-        if stale_sessions > 0:
-            logging.warning(f"Found {stale_sessions} potentially stale voice sessions")
-    
-    except Exception as e:
-        logging.error(f"Error in periodic voice processing: {e}")
+                while idle_heap and idle_heap[0][0] <= now:
+                    _, gen, user_id = heapq.heappop(idle_heap)
+                    session = sessions.get(user_id)
+                    
+                    # Skip checks replaced by a newer one, and users who left or are no longer active
+                    if (not session or session.idle_gen != gen or session.exit_processed
+                            or session.current_state != VoiceState.ACTIVE):
+                        continue
+                    
+                    # They spoke since this check was scheduled: move it to their new deadline
+                    deadline = session.last_spoke + IDLE_THRESHOLD
+                    if deadline > now:
+                        heapq.heappush(idle_heap, (deadline, gen, user_id))
+                        continue
+                    
+                    # Convert from active to idle. The session's member is only needed for
+                    # the log line, so the guild isn't looked up for it
+                    session.transition_to(VoiceState.IDLE, time.time())
+                    if _log_enabled(logging.INFO):
+                        time_since_last_spoke = now - session.last_spoke
+                        logging.info(f"User {session.member.display_name} is now idle after {time_since_last_spoke:.1f} seconds of inactivity")
+            except Exception as e:
+                logging.error(f"Error checking idle voice users: {e}")
+            
+            # Sleep until the earliest pending check, or until an earlier one is scheduled
+            timeout = idle_heap[0][0] - _now() if idle_heap else None
+            idle_wakeup.clear()
+            try:
+                await asyncio.wait_for(idle_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
-async def process_long_voice_sessions(bot, current_time):
-    """
-    Award XP for long voice sessions without ending them
-    This allows users to continue their sessions while still earning XP periodically
-    """
-    processed_count = 0
-    
-    for user_id, session in list(voice_sessions.items()):
+    async def periodic_processing_loop(self):
+        """Run periodic_voice_processing every PERIODIC_PROCESSING_INTERVAL"""
+        while True:
+            await self.periodic_voice_processing()
+            await asyncio.sleep(PERIODIC_PROCESSING_INTERVAL)
+
+    async def periodic_voice_processing(self):
+        """
+        Perform periodic processing of voice sessions
+        This includes processing long sessions and cleaning up inactive ones
+        """
         try:
-            # Skip sessions that were recently processed
-            if user_id in last_processed and current_time - last_processed[user_id] < PERIODIC_PROCESSING_INTERVAL:
+            current_time = time.time()
+            
+            # Close sessions whose leave event was missed
+            await self.sweep_orphaned_sessions()
+            
+            # Process any long-running voice sessions
+            await self.process_long_voice_sessions(current_time)
+            
+            # Clean up inactive sessions
+            self.cleanup_inactive_sessions(current_time)
+            
+            # Log memory stats periodically
+            sessions = self.sessions
+            total_sessions = len(sessions)
+            total_in_voice = sum(1 for session in sessions.values() if not session.exit_processed)
+            total_watchers = sum(1 for session in sessions.values() if session.watching)
+            
+            logging.info(f"Voice tracking stats: {total_sessions} active sessions, "
+                       f"{total_in_voice} in voice, {total_watchers} stream watchers")
+            
+            # Check for any potentially stale/orphaned sessions
+            stale_sessions = 0
+            for user_id, session in sessions.items():
+                # Sessions without exit_processed flag might be orphaned
+                if not session.ready_for_cleanup and current_time - session.state_start_time > 3600:
+                    logging.warning(f"Potentially stale voice session for {user_id}, "
+                                  f"active for {(current_time - session.state_start_time) / 60:.1f} minutes")
+                    stale_sessions += 1
+                    
+                    # If exceptionally old (over 6 hours), force cleanup
+                    if current_time - session.state_start_time > 6 * 3600:
+                        logging.warning(f"Force cleaning very stale voice session for {user_id}")
+                        session.ready_for_cleanup = True
+                        session.cleanup_time = current_time
+                        session.exit_processed = True  # Mark as processed so it can be cleaned up
+            
+            if stale_sessions > 0:
+                logging.warning(f"Found {stale_sessions} potentially stale voice sessions")
+        
+        except Exception as e:
+            logging.error(f"Error in periodic voice processing: {e}")
+
+    async def sweep_orphaned_sessions(self):
+        """
+        Close sessions whose user is no longer in a voice channel (e.g. the leave event was
+        dropped during a reconnect), awarding their XP as a normal leave would
+        """
+        # Find the orphans without awaiting, so the live dict can be iterated without a copy
+        orphans = []
+        for user_id, session in self.sessions.items():
+            if session.exit_processed:
                 continue
-                
-            # Get the duration of the current state
-            current_state = session["current_state"]
-            state_start_time = session["state_start_time"]
-            state_duration = current_time - state_start_time
             
-            # Process long sessions
-            if state_duration > LONG_SESSION_THRESHOLD:
-                # Find guild and member
-                guild_id = None
-                member = None
-                
-                for guild in bot.guilds:
-                    member = guild.get_member(int(user_id))
-                    if member:
-                        guild_id = str(guild.id)
-                        break
+            # Without the guild (not cached yet or unavailable) we can't tell whether the user left
+            guild = self.bot.get_guild(session.guild_id)
+            if not guild:
+                continue
+            
+            member = guild.get_member(user_id)
+            if member and member.voice and member.voice.channel:
+                continue
+            
+            orphans.append((user_id, session, member or session.member))
+        
+        orphaned_count = 0
+        for user_id, session, member in orphans:
+            # Skip users who rejoined (or were closed) while earlier orphans were processed
+            if self.sessions.get(user_id) is not session or session.exit_processed:
+                continue
+            
+            try:
+                await self.handle_voice_channel_exit(session.guild_id, user_id, member)
                 
-                if not guild_id or not member:
+                streamers = self.channel_streamers.get(session.channel_id)
+                if streamers is not None:
+                    streamers.discard(user_id)
+                orphaned_count += 1
+            except Exception as e:
+                logging.error(f"Error closing orphaned voice session for user {user_id}: {e}")
+        
+        if orphaned_count > 0:
+            logging.warning(f"Closed {orphaned_count} voice sessions whose users were no longer in voice")
+
+    async def process_long_voice_sessions(self, current_time):
+        """
+        Award XP for long voice sessions without ending them
+        This allows users to continue their sessions while still earning XP periodically
+        """
+        # Each guild's shard is processed concurrently, so one guild's event lookups don't hold up the rest
+        results = await asyncio.gather(
+            *(self.process_guild_long_sessions(guild_id, shard, current_time)
+              for guild_id, shard in self.guild_sessions.items()),
+            return_exceptions=True
+        )
+        
+        processed_count = 0
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Error processing long voice sessions for a guild: {result}")
+            else:
+                processed_count += result
+        
+        logging.info(f"Processed {processed_count} long voice sessions")
+
+    async def process_guild_long_sessions(self, guild_id, shard, current_time):
+        """Award XP for the long voice sessions in one guild's shard, returning how many were processed"""
+        # Close the current period of each long session first, so the guild's XP boost
+        # events are fetched once for the window all of their pending periods cover
+        due_sessions = []
+        for user_id, session in shard.items():
+            try:
+                # Skip sessions that ended or were recently processed
+                if session.exit_processed:
                     continue
-                
-                # Create a temporary state period for current state
-                temp_state_period = {
-                    "state": current_state,
-                    "start": state_start_time,
-                    "end": current_time,
-                    "channel_id": session["channel_id"]
-                }
-                
-                # Get all event information
-                all_events = await get_all_xp_boost_events_for_guild(guild_id)
-                
-                # Calculate XP for the period
-                duration_minutes = int(state_duration // 60)
-                if duration_minutes <= 0:
+                if session.last_processed and _now() - session.last_processed < PERIODIC_PROCESSING_INTERVAL:
                     continue
-                    
-                # Calculate base XP
-                base_xp = duration_minutes * XP_RATES[current_state]
                 
-                # Apply channel boost if applicable
-                channel_id = session["channel_id"]
-                boosted_xp = apply_channel_boost(base_xp, channel_id)
+                # Process long sessions
+                current_state = session.current_state
+                if current_time - session.state_start_time > LONG_SESSION_THRESHOLD:
+                    # Find member
+                    member = self.get_session_member(user_id)
+                    
+                    if not member:
+                        continue
+                    
+                    # Close the current period and restart the state from now, then award
+                    # everything not yet awarded (the exit only awards what comes after this)
+                    session.transition_to(current_state, current_time)
+                    due_sessions.append((user_id, session, member, current_state))
+            
+            except Exception as e:
+                logging.error(f"Error processing long voice session for user {user_id}: {e}")
+        
+        if not due_sessions:
+            return 0
+        
+        window_start = min(
+            period.start
+            for _, session, _, _ in due_sessions
+            for period in itertools.islice(session.state_history, session.xp_settled, None)
+        )
+        event_index = XPBoostEventIndex(await get_xp_boost_events_for_window(str(guild_id), window_start, current_time))
+        
+        processed_count = 0
+        for user_id, session, member, current_state in due_sessions:
+            try:
+                period_xp = await settle_session_xp(session, event_index)
                 
-                # Calculate event-adjusted XP
-                period_xp = await calculate_event_adjusted_xp(
-                    boosted_xp,
-                    state_start_time,
-                    current_time,
-                    all_events
-                )
+                # Update last processed time
+                session.last_processed = _now()
                 
                 if period_xp > 0:
                     # Award XP without ending the session
-                    await award_xp_without_event_multiplier(guild_id, user_id, period_xp, member)
-                    logging.info(f"Periodic XP: Awarded {period_xp} XP to {member.name} for long {current_state} session")
-                    
-                    # Update last processed time
-                    last_processed[user_id] = current_time
-                    
-                    # Reset the state start time to now to avoid double-counting
-                    session["state_start_time"] = current_time
-                    
-                    # Add the processed period to history
-                    if "state_history" not in session:
-                        session["state_history"] = []
-                    
-                    session["state_history"].append(temp_state_period)
+                    self.writer.submit(str(guild_id), str(user_id), period_xp, member)
+                    if _log_enabled(logging.INFO):
+                        logging.info(f"Periodic XP: Awarded {period_xp} XP to {member.name} for long {current_state} session")
                     
                     processed_count += 1
-        
-        except Exception as e:
-            logging.error(f"Error processing long voice session for user {user_id}: {e}")
-    
-    logging.info(f"Processed {processed_count} long voice sessions")
-    
-def cleanup_inactive_sessions(current_time):
-    """Clean up inactive voice sessions after a delay"""
-    to_remove = []
-    
-    for user_id, session in voice_sessions.items():
-        # Check if session is marked for cleanup and enough time has passed
-        if (session.get("ready_for_cleanup", False) and 
-            session.get("cleanup_time", 0) < current_time - 300 and  # 5 minutes delay (increased from previous)
-            session.get("exit_processed", False)):  # Ensure exit was processed
             
-            # Add to removal list
-            to_remove.append(user_id)
-            logging.info(f"Cleaning up voice session for user {user_id}")
-    
-    # Remove sessions
-    for user_id in to_remove:
-        if user_id in voice_sessions:
-            del voice_sessions[user_id]
+            except Exception as e:
+                logging.error(f"Error processing long voice session for user {user_id}: {e}")
+        
+        return processed_count
 
-def compact_large_histories():
-    """
-    Compact large state histories to prevent memory issues
-    This combines consecutive states of the same type
-    """
-    compacted_count = 0
-    
-    for user_id, session in voice_sessions.items():
-        try:
-            # Skip if no history or history is small
-            if "state_history" not in session or len(session["state_history"]) < MAX_STATE_HISTORY_ENTRIES:
-                continue
-            
-            history = session["state_history"]
-            new_history = []
-            
-            # Try to compact by combining consecutive identical states
-            if len(history) > 0:
-                current_group = history[0].copy()
-                
-                for i in range(1, len(history)):
-                    entry = history[i]
-                    
-                    # If same state and channel, combine them
-                    if (entry["state"] == current_group["state"] and 
-                        entry["channel_id"] == current_group["channel_id"]):
-                        # Extend the end time
-                        current_group["end"] = entry["end"]
-                    else:
-                        # Different state or channel, add the current group and start a new one
-                        new_history.append(current_group)
-                        current_group = entry.copy()
+    def cleanup_inactive_sessions(self, current_time):
+        """Clean up inactive voice sessions after a delay"""
+        to_remove = []
+        
+        for user_id, session in self.sessions.items():
+            # Check if session is marked for cleanup and enough time has passed
+            if (session.ready_for_cleanup and
+                session.cleanup_time < current_time - 300 and  # 5 minutes delay (increased from previous)
+                session.exit_processed):  # Ensure exit was processed
                 
-                # Add the last group
-                new_history.append(current_group)
-            
-            # Replace with compacted history if we saved space
-            if len(new_history) < len(history):
-                session["state_history"] = new_history
-                compacted_count += 1
-                logging.debug(f"Compacted voice history for user {user_id}: {len(history)} → {len(new_history)} entries")
+                # Add to removal list
+                to_remove.append(user_id)
+                if _log_enabled(logging.INFO):
+                    logging.info(f"Cleaning up voice session for user {user_id}")
         
-        except Exception as e:
-            logging.error(f"Error compacting voice history for user {user_id}: {e}")
-    
-    if compacted_count > 0:
-        logging.info(f"Compacted {compacted_count} voice session histories")
-
-async def start_periodic_processing(bot):
-    """Start the periodic processing task"""
-    periodic_voice_processing.start(bot)
-    logging.info("Started periodic voice session processing task")
-
-def stop_periodic_processing():
-    """Stop the periodic processing task"""
-    if periodic_voice_processing.is_running():
-        periodic_voice_processing.cancel()
-        logging.info("Stopped periodic voice session processing task")
\ No newline at end of file
+        # Remove sessions
+        for user_id in to_remove:
+            self.remove_session(user_id)
+
+async def start_voice_tracking(bot):
+    """Start the tasks of the bot's voice tracker"""
+    bot.voice_tracker.start()
+    return True
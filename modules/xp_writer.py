@@ -0,0 +1,150 @@
+"""
+Batched XP awarding for high-frequency sources such as voice activity.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from database import get_bulk_user_levels
+from modules.levels import award_xp_without_event_multiplier
+
+# Batching settings
+MAX_BATCH = 128  # flush early once this many (guild, user) awards are pending
+FLUSH_MS = 250  # milliseconds to collect awards before writing them
+XP_QUEUE_SIZE = 10000
+STOP_TIMEOUT = 10  # seconds to wait for the final flush on shutdown
+
+# Queued by stop() behind the last award; the flusher writes what it holds and exits
+_STOP = object()
+
+class AsyncXPBatchWriter:
+    """
+    Collects XP awards and applies them in batches from a background task.
+
+    Awards for the same user are merged, each guild's level rows are loaded with one
+    query, and the awards are applied concurrently. The level rows themselves are
+    written through the database batch queue (queue_xp_update).
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, flush_ms=FLUSH_MS, maxsize=XP_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.flush_interval = flush_ms / 1000
+        # XP awards waiting to be written: (guild_id, user_id, xp, member)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.task = None
+        self.stopping = False
+
+    def start(self):
+        """Start the background flusher"""
+        self.stopping = False
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Stop accepting awards and wait for the flusher to write everything queued
+
+        The flusher finishes its current batch, drains the queue into a final flush
+        and exits; it is only cancelled if that takes longer than the timeout.
+        """
+        self.stopping = True
+        task, self.task = self.task, None
+
+        if task and not task.done():
+            try:
+                await asyncio.wait_for(self._drain(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"XP writer did not finish flushing within {timeout} seconds, cancelling")
+                task.cancel()
+
+        if not self.queue.empty():
+            logging.warning(f"XP writer stopped with {self.queue.qsize()} unwritten awards")
+
+    async def _drain(self, task):
+        """Queue the stop sentinel behind the remaining awards and wait for the flusher to exit"""
+        # Submits are refused from here on, so the sentinel is the last item
+        await self.queue.put(_STOP)
+        # Shielded so a timeout in stop() leaves the decision to cancel the flusher to stop()
+        await asyncio.shield(task)
+
+    def submit(self, guild_id, user_id, xp, member):
+        """Queue an XP award without waiting for it to be written"""
+        if self.stopping:
+            logging.warning(f"XP writer stopping, dropping {xp} XP for user {user_id} in guild {guild_id}")
+            return
+        try:
+            self.queue.put_nowait((guild_id, user_id, xp, member))
+        except asyncio.QueueFull:
+            logging.warning(f"XP queue full, dropping {xp} XP for user {user_id} in guild {guild_id}")
+
+    async def _run(self):
+        """Merge queued awards until the interval or size limit, then flush them"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            # {(guild_id, user_id): [xp, member]}
+            pending = {}
+
+            # Wait for the first award, then collect more until the interval or size limit
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            deadline = loop.time() + self.flush_interval
+
+            while True:
+                guild_id, user_id, xp, member = item
+                key = (guild_id, user_id)
+                if key in pending:
+                    pending[key][0] += xp
+                    pending[key][1] = member
+                else:
+                    pending[key] = [xp, member]
+
+                if len(pending) >= self.max_batch:
+                    break
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+
+            try:
+                await self.flush(pending)
+            except Exception as e:
+                logging.error(f"Error flushing XP batch: {e}", exc_info=True)
+
+    async def flush(self, pending):
+        """Apply merged awards, one task per guild"""
+        by_guild = defaultdict(list)
+        for (guild_id, user_id), (xp, member) in pending.items():
+            by_guild[guild_id].append((user_id, xp, member))
+
+        results = await asyncio.gather(
+            *(self._flush_guild(guild_id, awards) for guild_id, awards in by_guild.items()),
+            return_exceptions=True
+        )
+        for guild_id, result in zip(by_guild, results):
+            if isinstance(result, Exception):
+                logging.error(f"Error awarding batched XP in guild {guild_id}: {result}")
+
+    async def _flush_guild(self, guild_id, awards):
+        """Load a guild's level rows in one query, then award each user's merged XP"""
+        # Warms the level cache so each award below reads its row without a query
+        await get_bulk_user_levels(guild_id, [user_id for user_id, _, _ in awards])
+
+        results = await asyncio.gather(
+            *(award_xp_without_event_multiplier(guild_id, user_id, xp, member)
+              for user_id, xp, member in awards),
+            return_exceptions=True
+        )
+        for (user_id, xp, _), result in zip(awards, results):
+            if isinstance(result, Exception):
+                logging.error(f"Error awarding {xp} XP to user {user_id} in guild {guild_id}: {result}")
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 import discord
 import io
@@ -9,113 +10,90 @@ from concurrent.futures import ThreadPoolExecutor
 # Adjust max_workers based on your server's CPU capacity
 image_thread_pool = ThreadPoolExecutor(max_workers=2)
 
-# Queue for tracking pending image generation tasks
-# Structure: (future, context, message_to_update, start_time)
-pending_images = []
+# Seconds to wait for an image before giving up on it
+IMAGE_TIMEOUT = 60
 
 async def start_image_processor(bot):
-    """Start the background task for processing images"""
-    bot.image_processor_running = True
-    bot.loop.create_task(process_image_queue(bot))
-    logging.info("Image processor background task started")
+    """Prepare the image processor (each image is delivered by the request that queued it)"""
+    logging.info("Image processor ready")
 
-async def process_image_queue(bot):
-    """Background task that processes the image generation queue"""
-    while bot.image_processor_running:
-        try:
-            # Check for completed image futures
-            now = time.time()
-            completed = []
-            
-            for i, (future, ctx, message, start_time, image_type) in enumerate(pending_images):
-                if future.done():
-                    # Mark this task for removal from the queue
-                    completed.append(i)
-                    
-                    try:
-                        # Get the result (will raise exception if the future failed)
-                        image_bytes = future.result()
-                        
-                        if image_bytes:
-                            # Create a discord File object from the bytes
-                            file = discord.File(image_bytes, filename=f"{image_type}.png")
-                            
-                            # Update the original message with the image
-                            if message:
-                                try:
-                                    await message.edit(content=None, file=file)
-                                except discord.HTTPException:
-                                    # If editing fails (e.g., can't edit with attachments), send a new message
-                                    await ctx.send(file=file)
-                            else:
-                                # No message to update, send a new one
-                                await ctx.send(file=file)
-                        else:
-                            # Image generation failed
-                            await ctx.send("❌ Failed to generate the image. Please try again.")
-                    
-                    except Exception as e:
-                        logging.error(f"Error processing image result: {e}")
-                        await ctx.send(f"❌ Error generating image: {str(e)}")
-                    
-                    # Log performance metrics
-                    generation_time = now - start_time
-                    logging.info(f"Image generation completed in {generation_time:.2f} seconds")
-                
-                # Check for timeouts (images taking too long)
-                elif now - start_time > 60:  # 60 second timeout
-                    completed.append(i)
-                    future.cancel()  # Try to cancel the task
-                    await ctx.send("⚠️ Image generation timed out. Please try again later.")
-                    logging.warning(f"Image generation task timed out after {now - start_time:.2f} seconds")
-            
-            # Remove completed tasks from the queue (in reverse order to avoid index issues)
-            for index in sorted(completed, reverse=True):
-                if index < len(pending_images):
-                    pending_images.pop(index)
-            
-            # Sleep briefly before checking again
-            await asyncio.sleep(0.5)
+async def _deliver(image_bytes, ctx, message, start_time, image_type):
+    """
+    Post a generated image, replacing the placeholder message when possible
+    
+    Each request delivers its own image, so deliveries for different requests
+    already overlap on the event loop. Errors are contained here so a failed
+    send never escapes into the caller.
+    """
+    try:
+        if image_bytes:
+            # Create a discord File object from the bytes
+            file = discord.File(image_bytes, filename=f"{image_type}.png")
             
-        except Exception as e:
-            logging.error(f"Error in image queue processor: {e}")
-            await asyncio.sleep(5)  # Back off on errors
+            # Update the original message with the image
+            if message:
+                try:
+                    await message.edit(content=None, file=file)
+                except discord.HTTPException:
+                    # If editing fails (e.g., can't edit with attachments), send a new message
+                    await ctx.send(file=file)
+            else:
+                # No message to update, send a new one
+                await ctx.send(file=file)
+        else:
+            # Image generation failed
+            await ctx.send("❌ Failed to generate the image. Please try again.")
+    
+    except Exception as e:
+        logging.error(f"Error processing image result: {e}")
+        try:
+            await ctx.send(f"❌ Error generating image: {str(e)}")
+        except discord.HTTPException as send_error:
+            logging.error(f"Error reporting image failure: {send_error}")
+    
+    # Log performance metrics
+    generation_time = time.time() - start_time
+    logging.info(f"Image generation completed in {generation_time:.2f} seconds")
 
 async def queue_image_generation(ctx, generate_func, *args, **kwargs):
     """
-    Queue an image generation task and return a placeholder message
+    Generate an image behind a placeholder message and post it when ready
     
     Parameters:
     - ctx: The Discord context
-    - generate_func: The image generation function (must be async)
+    - generate_func: The image generation function. Async functions are awaited
+      directly; synchronous (CPU-bound) ones run in the image thread pool
     - *args, **kwargs: Arguments to pass to the generator function
     
     Returns:
-    - The placeholder message that will be updated when the image is ready
+    - The placeholder message, updated with the image
     """
     # Extract image_type from kwargs or use default
     image_type = kwargs.pop('image_type', 'image')
     
     # Create a placeholder loading message
     message = await ctx.send(f"🔄 Generating {image_type}... This may take a moment.")
+    start_time = time.time()
     
-    # First get the image bytes in the main thread using the async function
     try:
-        # Call the async function directly in the main thread
-        image_bytes = await generate_func(*args, **kwargs)
-        
-        # If successful, create a thread pool task to process the image
-        # This is just a simple function that returns the bytes we already have
-        def return_bytes():
-            return image_bytes
-            
-        future = image_thread_pool.submit(return_bytes)
-        
-        # Add to pending queue for the processor to handle
-        pending_images.append((future, ctx, message, time.time(), image_type))
-        
+        if asyncio.iscoroutinefunction(generate_func):
+            pending = generate_func(*args, **kwargs)
+        else:
+            # Only hand work to the pool when there is CPU work for it to do
+            pending = asyncio.get_running_loop().run_in_executor(
+                image_thread_pool, functools.partial(generate_func, *args, **kwargs)
+            )
+        image_bytes = await asyncio.wait_for(pending, timeout=IMAGE_TIMEOUT)
+    
+    except asyncio.TimeoutError:
+        logging.warning(f"Image generation task timed out after {time.time() - start_time:.2f} seconds")
+        await message.edit(content="⚠️ Image generation timed out. Please try again later.")
+        return message
+    
     except Exception as e:
         logging.error(f"Error in queue_image_generation: {e}")
         await message.edit(content=f"❌ Error generating image: {str(e)}")
+        return message
     
-    return message
\ No newline at end of file
+    await _deliver(image_bytes, ctx, message, start_time, image_type)
+    return message
@@ -1,42 +1,135 @@
+import os
+import glob
 import time
 import asyncio
 import logging
 import io
-from collections import OrderedDict
-import aiohttp
+import threading
+from config import load_config
+from utils.http_session import get_session, read_body
+
+# Avatars are also kept on disk so a restart doesn't mean re-downloading every one.
+# Files are named by user ID and avatar hash, so a changed avatar never matches a stale file.
+AVATAR_CACHE_DIR = os.path.join(load_config().get("EXTERNAL_VOLUME_PATH", "/external_volume"), "avatar_cache")
+os.makedirs(AVATAR_CACHE_DIR, exist_ok=True)
+
+# Cap on avatar files kept on disk; past it the least recently used are pruned by mtime
+AVATAR_DISK_MAX_FILES = 5000
+AVATAR_DISK_PRUNE_TO = 4500  # prune below the cap so it isn't hit again on the next write
+
+# Writes run in executor threads, so the file count is guarded by a lock
+_disk_lock = threading.Lock()
+_disk_file_count = None  # counted by the first write
+
+def _disk_avatar_path(user_id, avatar_hash):
+    """Get the on-disk path for a user's avatar with the given hash"""
+    return os.path.join(AVATAR_CACHE_DIR, f"{user_id}-{avatar_hash}.img")
+
+def _read_disk_avatar(user_id, avatar_hash):
+    """Read a user's avatar from the disk cache, or None if it isn't there"""
+    try:
+        path = _disk_avatar_path(user_id, avatar_hash)
+        with open(path, 'rb') as f:
+            avatar_bytes = f.read()
+        # Mark the file as recently used so pruning keeps it
+        os.utime(path)
+        return avatar_bytes
+    except OSError:
+        return None
+
+def _prune_disk_avatars():
+    """Delete the least recently used avatar files down to the prune target, returning how many remain"""
+    entries = []
+    with os.scandir(AVATAR_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.img'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+    
+    if len(entries) <= AVATAR_DISK_MAX_FILES:
+        return len(entries)
+    
+    entries.sort()
+    removed = 0
+    for _, path in entries[:len(entries) - AVATAR_DISK_PRUNE_TO]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            continue
+    logging.info(f"Pruned {removed} least recently used avatars from the disk cache")
+    return len(entries) - removed
+
+def _write_disk_avatar(user_id, avatar_hash, avatar_bytes):
+    """Store a user's avatar on disk, replacing any file for an older hash and pruning past the cap"""
+    global _disk_file_count
+    path = _disk_avatar_path(user_id, avatar_hash)
+    try:
+        added = 0 if os.path.exists(path) else 1
+        for old_path in glob.glob(os.path.join(AVATAR_CACHE_DIR, f"{user_id}-*.img")):
+            if old_path != path:
+                os.remove(old_path)
+                added -= 1
+        
+        # Write to a temporary file first so readers never see a partial avatar
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(avatar_bytes)
+        os.replace(tmp_path, path)
+        
+        with _disk_lock:
+            if _disk_file_count is None:
+                _disk_file_count = _prune_disk_avatars()
+            else:
+                _disk_file_count += added
+                if _disk_file_count > AVATAR_DISK_MAX_FILES:
+                    _disk_file_count = _prune_disk_avatars()
+    except OSError as e:
+        logging.error(f"Error writing avatar for {user_id} to disk cache: {e}")
 
 class AvatarCache:
     """LRU cache for Discord user avatars with time expiration"""
     
-    def __init__(self, max_size=100, ttl=3600):
+    def __init__(self, max_size=100, ttl=3600, max_bytes=None):
         """
         Initialize the avatar cache
         
         Parameters:
         - max_size: Maximum number of avatars to store in cache
         - ttl: Time-to-live in seconds (default: 1 hour)
+        - max_bytes: Optional cap on the total size of cached avatar data
         """
-        self.cache = OrderedDict()  # {user_id: (avatar_bytes, timestamp, avatar_hash)}
+        # Plain dicts keep insertion order, so the first key is always the least recently used
+        self.cache = {}  # {user_id: (avatar_bytes, timestamp, avatar_hash)}
         self.max_size = max_size
         self.ttl = ttl
-        self._cleanup_task = None
-    
-    def start_cleanup_task(self, loop=None):
-        """Start periodic cleanup of expired cache entries"""
-        if self._cleanup_task is None:
-            loop = loop or asyncio.get_event_loop()
-            self._cleanup_task = loop.create_task(self._periodic_cleanup())
-            logging.info(f"Avatar cache cleanup task started (TTL: {self.ttl}s, Max Size: {self.max_size})")
-    
-    async def _periodic_cleanup(self):
-        """Periodically remove expired entries from cache"""
-        while True:
-            try:
-                # Run cleanup every 10 minutes
-                await asyncio.sleep(600)
-                self.remove_expired()
-            except Exception as e:
-                logging.error(f"Error in avatar cache cleanup: {e}")
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+    
+    def _discard(self, user_id):
+        """Remove an entry, keeping the byte total in step"""
+        entry = self.cache.pop(user_id, None)
+        if entry is None:
+            return False
+        self.total_bytes -= len(entry[0])
+        return True
+    
+    def _evict_expired_prefix(self):
+        """
+        Drop expired entries from the front of the cache
+        
+        Entries are appended as they are stored, so expired ones collect at the
+        front and this stops at the first live entry. Anything it misses still
+        expires on lookup or falls off the LRU end.
+        """
+        current_time = time.time()
+        while self.cache:
+            user_id = next(iter(self.cache))
+            if current_time - self.cache[user_id][1] <= self.ttl:
+                break
+            self._discard(user_id)
     
     def remove_expired(self):
         """Remove expired entries from the cache"""
@@ -47,7 +140,7 @@ class AvatarCache:
         ]
         
         for user_id in expired_keys:
-            self.cache.pop(user_id, None)
+            self._discard(user_id)
         
         if expired_keys:
             logging.debug(f"Removed {len(expired_keys)} expired avatars from cache")
@@ -69,18 +162,20 @@ class AvatarCache:
             
             # Check if expired
             if current_time - timestamp > self.ttl:
-                del self.cache[user_id]
+                self._discard(user_id)
                 return None
             
             # Check if avatar changed (hash mismatch)
             if avatar_hash and cached_hash != avatar_hash:
-                del self.cache[user_id]
+                self._discard(user_id)
                 return None
             
-            # Move to end (mark as recently used)
-            self.cache.move_to_end(user_id)
+            # Reinsert at the end (mark as recently used)
+            self.cache[user_id] = self.cache.pop(user_id)
             return avatar_bytes
         
+        # Purge expired entries on a miss, since a download and set() will follow
+        self._evict_expired_prefix()
         return None
     
     def set(self, user_id, avatar_bytes, avatar_hash=None):
@@ -92,24 +187,28 @@ class AvatarCache:
         - avatar_bytes: Avatar image data
         - avatar_hash: Avatar hash for freshness checks
         """
-        # If at capacity, remove least recently used item
-        if len(self.cache) >= self.max_size:
-            self.cache.popitem(last=False)
+        # Drop any existing entry so the new one lands at the end (most recently used)
+        self._discard(user_id)
+        self._evict_expired_prefix()
+        
+        # If at capacity (by count or by bytes), remove least recently used items
+        while self.cache and (
+            len(self.cache) >= self.max_size
+            or (self.max_bytes and self.total_bytes + len(avatar_bytes) > self.max_bytes)
+        ):
+            self._discard(next(iter(self.cache)))
         
         self.cache[user_id] = (avatar_bytes, time.time(), avatar_hash)
-        # Move to end (mark as recently used)
-        self.cache.move_to_end(user_id)
+        self.total_bytes += len(avatar_bytes)
     
     def invalidate(self, user_id):
         """Remove specific user from cache"""
-        if user_id in self.cache:
-            del self.cache[user_id]
-            return True
-        return False
+        return self._discard(user_id)
     
     def clear(self):
         """Clear all entries from cache"""
         self.cache.clear()
+        self.total_bytes = 0
     
     def __len__(self):
         """Return current cache size"""
@@ -125,17 +224,25 @@ class AvatarCache:
         return {
             "size": len(self.cache),
             "max_size": self.max_size,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
             "ttl": self.ttl,
             "average_age": avg_age
         }
 
 # Create global instance
-avatar_cache = AvatarCache(max_size=200, ttl=3600)
+avatar_cache = AvatarCache(max_size=200, ttl=3600, max_bytes=16 * 1024 * 1024)
+
+# In-flight downloads by (user ID, avatar hash), so concurrent requests for one avatar share a
+# single fetch while a request for a newer avatar never joins the download of the old one
+_inflight = {}
 
 async def get_cached_avatar(member, bot=None):
     """
     Get avatar for a Discord member, using cache when possible
     
+    Concurrent calls for the same member share a single download.
+    
     Parameters:
     - member: discord.Member object
     - bot: Optional bot instance (not used but included for compatibility)
@@ -148,40 +255,65 @@ async def get_cached_avatar(member, bot=None):
         
     user_id = str(member.id)
     
-    # Get avatar hash for freshness check
-    avatar_hash = None
-    if hasattr(member, 'guild_avatar') and member.guild_avatar:
-        avatar_hash = member.guild_avatar.key
-    elif member.avatar:
-        avatar_hash = member.avatar.key
+    # Resolve the shown avatar (guild, then global, then default) once for both the hash and the URL
+    asset = member.display_avatar
+    avatar_hash = asset.key
     
     # Try to get from cache first
     cached_avatar = avatar_cache.get(user_id, avatar_hash)
     if cached_avatar:
         return cached_avatar
     
-    # Otherwise download the avatar
+    # Join a download that is already running for this avatar
+    key = (user_id, avatar_hash)
+    download = _inflight.get(key)
+    if download is None:
+        download = asyncio.ensure_future(_download_avatar(member, user_id, avatar_hash, asset.url))
+        _inflight[key] = download
+        download.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # Shield the shared download so one cancelled caller doesn't cancel the others
+    return await asyncio.shield(download)
+
+async def _download_avatar(member, user_id, avatar_hash, avatar_url):
+    """Load a member's avatar from disk or download it, and store it in the cache"""
+    loop = asyncio.get_running_loop()
+    
+    avatar_bytes = await loop.run_in_executor(None, _read_disk_avatar, user_id, avatar_hash)
+    if avatar_bytes:
+        avatar_cache.set(user_id, avatar_bytes, avatar_hash)
+        return avatar_bytes
+    
     try:
-        avatar_url = None
-        if hasattr(member, 'guild_avatar') and member.guild_avatar:
-            avatar_url = member.guild_avatar.url
-        elif member.avatar:
-            avatar_url = member.avatar.url
-        else:
-            avatar_url = member.default_avatar.url
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(avatar_url) as resp:
-                if resp.status == 200:
-                    avatar_bytes = await resp.read()
-                    
-                    # Store in cache
-                    avatar_cache.set(user_id, avatar_bytes, avatar_hash)
-                    
-                    return avatar_bytes
-                else:
-                    logging.warning(f"Failed to download avatar for {member.name} (status: {resp.status})")
-                    return None
+        session = await get_session()
+        async with session.get(avatar_url) as resp:
+            if resp.status == 200:
+                avatar_bytes = await read_body(resp)
+                
+                # Store in cache, and on disk in the background
+                avatar_cache.set(user_id, avatar_bytes, avatar_hash)
+                loop.run_in_executor(None, _write_disk_avatar, user_id, avatar_hash, avatar_bytes)
+                
+                return avatar_bytes
+            else:
+                logging.warning(f"Failed to download avatar for {member.name} (status: {resp.status})")
+                return None
     except Exception as e:
         logging.error(f"Error downloading avatar for {member.name}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def get_cached_avatars(members):
+    """
+    Get avatars for several members at once, downloading cache misses concurrently
+    
+    Parameters:
+    - members: Iterable of discord.Member objects
+    
+    Returns:
+    - list: Avatar bytes (or None) for each member, in the same order
+    """
+    results = await asyncio.gather(
+        *(get_cached_avatar(member) for member in members),
+        return_exceptions=True
+    )
+    return [None if isinstance(result, BaseException) else result for result in results]
\ No newline at end of file
@@ -1,7 +1,8 @@
 import os
+import hashlib
 import logging
-import aiohttp
 import aiofiles
+import aiofiles.os as aio_os
 from discord import Member, Attachment
 from typing import Optional, List, Tuple, Union
 import asyncio
@@ -13,6 +14,7 @@ from database import (
     get_guild_backgrounds
 )
 from config import load_config
+from utils.http_session import get_session, read_body
 
 # Load the external volume path from config
 config = load_config()
@@ -22,6 +24,36 @@ BACKGROUNDS_DIR = os.path.join(EXTERNAL_VOLUME_PATH, "backgrounds")
 # Ensure backgrounds directory exists at module import time
 os.makedirs(BACKGROUNDS_DIR, exist_ok=True)
 
+# Guild directories already created this run, so repeat lookups skip the makedirs syscall
+_known_guild_dirs = set()
+
+# Largest background image we will download (10 MB)
+MAX_BACKGROUND_BYTES = 10 * 1024 * 1024
+
+# Writes at least this large skip aiofiles and go straight to the executor in one call
+LARGE_WRITE_BYTES = 256 * 1024
+
+# File extensions for the image types a background may be stored as
+IMAGE_CONTENT_TYPES = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+def _file_md5(path: str) -> Optional[str]:
+    """Return the MD5 hex digest of a file, or None if it can't be read"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'md5').hexdigest()
+    except OSError:
+        return None
+
+def _write_file(path: str, data: bytes) -> None:
+    """Write a file in one call (large writes go straight past the buffer)"""
+    with open(path, 'wb') as f:
+        f.write(data)
+
 class BackgroundError(Exception):
     """Base class for background-related exceptions"""
     pass
@@ -41,7 +73,9 @@ class BackgroundAPI:
     def get_guild_dir(guild_id: str) -> str:
         """Get the directory path for a guild's backgrounds"""
         guild_dir = os.path.join(BACKGROUNDS_DIR, guild_id)
-        os.makedirs(guild_dir, exist_ok=True)
+        if guild_id not in _known_guild_dirs:
+            os.makedirs(guild_dir, exist_ok=True)
+            _known_guild_dirs.add(guild_id)
         return guild_dir
     
     @staticmethod
@@ -59,26 +93,78 @@ class BackgroundAPI:
         return full_path, relative_path
     
     @staticmethod
-    async def download_from_url(url: str) -> bytes:
-        """Download an image from a URL and return the bytes"""
+    async def download_from_url(url: str) -> Tuple[bytes, str]:
+        """
+        Download an image from a URL
+        
+        Returns:
+            Tuple[bytes, str]: (image_data, content_type)
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        raise DownloadError(f"Failed to download image, status code: {resp.status}")
-                    return await resp.read()
+            session = await get_session()
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise DownloadError(f"Failed to download image, status code: {resp.status}")
+                return await read_body(resp, max_bytes=MAX_BACKGROUND_BYTES), resp.content_type
         except Exception as e:
             raise DownloadError(f"Error downloading image: {str(e)}")
     
+    @staticmethod
+    def detect_image_extension(image_data: bytes, content_type: str = "") -> str:
+        """
+        Pick a file extension from the response Content-Type, falling back to the
+        image's magic bytes and finally to png
+        """
+        file_ext = IMAGE_CONTENT_TYPES.get(content_type.lower())
+        if file_ext:
+            return file_ext
+        
+        if image_data.startswith(b"\x89PNG"):
+            return "png"
+        if image_data.startswith(b"\xff\xd8\xff"):
+            return "jpg"
+        if image_data.startswith(b"GIF8"):
+            return "gif"
+        if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+            return "webp"
+        return "png"  # Default to png if unrecognized
+    
     @staticmethod
     async def save_background(image_data: bytes, full_path: str) -> None:
         """Save image data to a file"""
         try:
-            async with aiofiles.open(full_path, 'wb') as f:
-                await f.write(image_data)
+            if len(image_data) >= LARGE_WRITE_BYTES:
+                await asyncio.get_running_loop().run_in_executor(None, _write_file, full_path, image_data)
+            else:
+                async with aiofiles.open(full_path, 'wb') as f:
+                    await f.write(image_data)
         except Exception as e:
             raise StorageError(f"Error saving background: {str(e)}")
     
+    @staticmethod
+    async def url_matches_file(url: str, full_path: str) -> bool:
+        """
+        Check whether a URL serves the same image as a file on disk without downloading it
+        
+        Discord's CDN sends the content MD5 as the ETag, so a HEAD request is
+        enough to compare. Any other ETag, or any error, counts as a mismatch.
+        """
+        try:
+            session = await get_session()
+            async with session.head(url, allow_redirects=True) as resp:
+                if resp.status != 200:
+                    return False
+                etag = resp.headers.get("ETag", "").removeprefix("W/").strip('"').lower()
+            
+            if len(etag) != 32:
+                return False
+            
+            digest = await asyncio.get_running_loop().run_in_executor(None, _file_md5, full_path)
+            return digest == etag
+        except Exception as e:
+            logging.debug(f"Could not compare background URL with {full_path}: {e}")
+            return False
+    
     @staticmethod
     async def set_from_url(guild_id: str, user_id: str, url: str) -> str:
         """
@@ -91,16 +177,20 @@ class BackgroundAPI:
             DownloadError: If the image cannot be downloaded
             StorageError: If the image cannot be saved
         """
-        # Extract file extension from URL
-        file_ext = url.split('.')[-1].lower()
-        if file_ext not in ['png', 'jpg', 'jpeg', 'gif']:
-            file_ext = 'png'  # Default to png if unrecognized
+        # Re-applying the same image is common; skip the download if nothing changed
+        existing_path = await get_user_background(guild_id, user_id)
+        if existing_path:
+            existing_full_path = os.path.join(EXTERNAL_VOLUME_PATH, existing_path)
+            if await BackgroundAPI.url_matches_file(url, existing_full_path):
+                logging.info(f"Background for {guild_id}/{user_id} is unchanged, keeping {existing_path}")
+                return existing_path
         
-        # Get paths
-        full_path, relative_path = BackgroundAPI.get_background_path(guild_id, user_id, file_ext)
+        # Download the image; the URL tail can't be trusted for the type (CDN query strings)
+        image_data, content_type = await BackgroundAPI.download_from_url(url)
+        file_ext = BackgroundAPI.detect_image_extension(image_data, content_type)
         
-        # Download and save the image
-        image_data = await BackgroundAPI.download_from_url(url)
+        # Get paths and save the image
+        full_path, relative_path = BackgroundAPI.get_background_path(guild_id, user_id, file_ext)
         await BackgroundAPI.save_background(image_data, full_path)
         
         # Save to database
@@ -141,8 +231,8 @@ class BackgroundAPI:
         # Delete file if it exists
         try:
             full_path = os.path.join(EXTERNAL_VOLUME_PATH, relative_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            if await aio_os.path.exists(full_path):
+                await aio_os.remove(full_path)
                 logging.info(f"Removed background file: {full_path}")
         except Exception as e:
             logging.error(f"Error removing background file: {e}")
@@ -166,7 +256,7 @@ class BackgroundAPI:
         
         full_path = os.path.join(EXTERNAL_VOLUME_PATH, relative_path)
         
-        if os.path.exists(full_path):
+        if await aio_os.path.exists(full_path):
             return full_path
         else:
             logging.warning(f"Background file not found: {full_path}")
@@ -187,15 +277,26 @@ class BackgroundAPI:
             List[Tuple[str, str]]: List of (guild_id, user_id) tuples that were cleaned up
         """
         backgrounds = await get_all_user_backgrounds()
-        removed = []
         
-        for guild_id, user_id, relative_path in backgrounds:
-            full_path = os.path.join(EXTERNAL_VOLUME_PATH, relative_path)
-            if not os.path.exists(full_path):
+        # Stat every file in one executor call instead of blocking the event loop per file
+        missing = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [
+                not os.path.exists(os.path.join(EXTERNAL_VOLUME_PATH, relative_path))
+                for _, _, relative_path in backgrounds
+            ]
+        )
+        
+        removed = []
+        for (guild_id, user_id, relative_path), is_missing in zip(backgrounds, missing):
+            if is_missing:
                 logging.info(f"Removing missing background entry for {guild_id}/{user_id}: {relative_path}")
-                await remove_user_background(guild_id, user_id)
                 removed.append((guild_id, user_id))
         
+        # Remove the stale entries concurrently
+        await asyncio.gather(*(
+            remove_user_background(guild_id, user_id) for guild_id, user_id in removed
+        ))
+        
         return removed
     
     @staticmethod
@@ -8,18 +8,16 @@ import time
 import random
 import weakref
 import logging
-import aiohttp
 import asyncio
 import os.path
-import tempfile
 import functools
 import threading
 import unicodedata
 import bidi.algorithm
 from config import load_config
-from PIL import Image, ImageFont, ImageDraw
+from PIL import Image, ImageFont, ImageDraw, ImageChops
 from utils.memory_cache import MemoryAwareCache
-from utils.avatar_cache import get_cached_avatar
+from utils.avatar_cache import get_cached_avatar, get_cached_avatars
 from utils.simple_image_handler import run_in_executor
 from database import get_user_rank, get_user_background
 from utils.background_api import BackgroundAPI
@@ -389,12 +387,23 @@ def optimized_draw_text(ctx, text, x, y, script=None, size=22, rgb_color=(1, 1,
         pos_x = x - text_width // 2
         pos_y = y - text_height // 2
     
-    # Pre-render text to PIL image
-    text_img, _, _ = prerender_text_image(display_text, font, rgb_color)
-    
-    # Convert PIL image to Cairo surface
+    # Draw via the cached text surface
     return draw_text_with_pil(ctx, display_text, pos_x, pos_y, font, rgb_color, centered)
 
+def pil_to_surface(img):
+    """
+    Build a Cairo surface directly from an RGBA PIL image's pixels
+    
+    Cairo's FORMAT_ARGB32 is premultiplied and native-endian, which on
+    little-endian machines is exactly PIL's 'BGRa' raw layout, so no PNG
+    encode/decode or per-pixel conversion is needed.
+    """
+    width, height = img.size
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+    # create_for_data needs a writable buffer; pycairo keeps it alive with the surface
+    data = bytearray(img.tobytes('raw', 'BGRa', stride))
+    return cairo.ImageSurface.create_for_data(data, cairo.FORMAT_ARGB32, width, height, stride)
+
 def load_image_surface(img_path, width=None, height=None):
     """Load an image into a Cairo surface"""
     try:
@@ -413,24 +422,37 @@ def load_image_surface(img_path, width=None, height=None):
             background.paste(img, (0, 0), img)
             img = background
         
-        # Save to temporary file - this is the most reliable way to convert PIL to Cairo surfaces
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            img.save(tmp.name, format='PNG')
-            tmp_path = tmp.name
-        
-        # Load with Cairo
-        surface = cairo.ImageSurface.create_from_png(tmp_path)
-        
-        # Clean up
-        os.unlink(tmp_path)
-        
-        return surface
+        return pil_to_surface(img)
     except Exception as e:
         logging.error(f"Error loading image surface from {img_path}: {e}")
         return None
 
-def load_surface_from_bytes(bytes_io, width=None, height=None):
-    """Load an image from bytes into a Cairo surface"""
+def get_background_surface(img_path, width, height):
+    """
+    Load a background into a Cairo surface, reusing the cached surface until
+    the file changes (the key includes its modification time)
+    """
+    cache_key = (img_path, os.stat(img_path).st_mtime, width, height)
+    surface = BACKGROUND_CACHE.get(cache_key)
+    if surface is None:
+        surface = load_image_surface(img_path, width, height)
+        BACKGROUND_CACHE.set(cache_key, surface)
+    return surface
+
+@functools.lru_cache(maxsize=8)
+def get_circle_mask(width, height):
+    """Cache anti-aliased ellipse masks (drawn at 4x and downsampled) by size"""
+    mask = Image.new('L', (width * 4, height * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, width * 4, height * 4), fill=255)
+    return mask.resize((width, height), Image.LANCZOS)
+
+def load_surface_from_bytes(bytes_io, width=None, height=None, circular=False):
+    """
+    Load an image from bytes into a Cairo surface
+    
+    With circular=True the image is cropped to an ellipse in PIL, so the
+    surface can be painted directly without a Cairo clip.
+    """
     try:
         # Open image and ensure it's in RGBA mode to preserve transparency
         img = Image.open(bytes_io).convert('RGBA')
@@ -446,22 +468,48 @@ def load_surface_from_bytes(bytes_io, width=None, height=None):
             background.paste(img, (0, 0), img)
             img = background
         
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            img.save(tmp.name, format='PNG')
-            tmp_path = tmp.name
-        
-        # Load with Cairo
-        surface = cairo.ImageSurface.create_from_png(tmp_path)
+        if circular:
+            img.putalpha(ImageChops.multiply(img.getchannel('A'), get_circle_mask(*img.size)))
         
-        # Clean up
-        os.unlink(tmp_path)
-        
-        return surface
+        return pil_to_surface(img)
     except Exception as e:
         logging.error(f"Error loading image from bytes: {e}")
         return None
 
+@functools.lru_cache(maxsize=256)
+def render_text_surface(text, pil_font, rgb_color):
+    """
+    Render text with a PIL font into a transparent Cairo surface
+    
+    Cached per (text, font, color); the surfaces are only ever used as paint sources.
+    """
+    text_width, text_height = measure_text_size(text, pil_font)
+    
+    # Render the text in its final color into a transparent PIL image
+    # This is needed because Cairo cannot directly use PIL fonts
+    rgb_int = (int(rgb_color[0] * 255), int(rgb_color[1] * 255), int(rgb_color[2] * 255))
+    temp_img = Image.new('RGBA', (text_width + 10, text_height + 20), (0, 0, 0, 0))
+    temp_draw = ImageDraw.Draw(temp_img)
+    temp_draw.text((5, 5), text, font=pil_font, fill=(*rgb_int, 255))
+    
+    # Hand the pixels to Cairo in one go rather than filling them one at a time
+    return pil_to_surface(temp_img)
+
+def get_avatar_surface(avatar_bytes, size):
+    """
+    Get a circular avatar surface of the given size, reusing the processed
+    surface when the same avatar was drawn before
+    """
+    # bytes cache their own hash, so this key is cheap after the first lookup
+    avatar_key = f"avatar_{size}_{hash(avatar_bytes)}"
+    avatar_surface = TEMPLATE_CACHE.get(avatar_key)
+    
+    if avatar_surface is None:
+        avatar_surface = load_surface_from_bytes(io.BytesIO(avatar_bytes), size, size, circular=True)
+        TEMPLATE_CACHE.set(avatar_key, avatar_surface)
+    
+    return avatar_surface
+
 def draw_text_with_pil(ctx, text, x, y, pil_font, rgb_color=(1, 1, 1), centered=False):
     """
     Draw text using PIL for font handling and Cairo for rendering
@@ -484,42 +532,8 @@ def draw_text_with_pil(ctx, text, x, y, pil_font, rgb_color=(1, 1, 1), centered=
         position_x = x - text_width // 2
         position_y = y - text_height // 2
     
-    # Convert the text to a temporary PIL image with transparency
-    # This is needed because Cairo cannot directly use PIL fonts
-    temp_img = Image.new('RGBA', (text_width + 10, text_height + 20), (0, 0, 0, 0))
-    temp_draw = ImageDraw.Draw(temp_img)
-    temp_draw.text((5, 5), text, font=pil_font, fill=(255, 255, 255, 255))
-    
-    # Create a numpy array from the PIL image
-    import numpy as np
-    arr = np.array(temp_img)
-    
-    # Create a Cairo surface from the numpy array
-    h, w, _ = arr.shape
-    
-    # Create temporary Cairo surface to hold the text
-    text_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
-    text_ctx = cairo.Context(text_surface)
-    
-    # Cairo uses ARGB format, PIL uses RGBA - we need to swap the channels
-    # Extract alpha channel and RGB channels
-    alpha = arr[:, :, 3] / 255.0
-    r = arr[:, :, 0] / 255.0
-    g = arr[:, :, 1] / 255.0
-    b = arr[:, :, 2] / 255.0
-    
-    # Apply the color tint
-    r = r * rgb_color[0]
-    g = g * rgb_color[1]
-    b = b * rgb_color[2]
-    
-    # For each pixel, set the color and alpha
-    for y_pos in range(h):
-        for x_pos in range(w):
-            a = alpha[y_pos, x_pos]
-            text_ctx.set_source_rgba(r[y_pos, x_pos], g[y_pos, x_pos], b[y_pos, x_pos], a)
-            text_ctx.rectangle(x_pos, y_pos, 1, 1)
-            text_ctx.fill()
+    # Rendered text is reused across cards (labels like RANK/LEVEL never change)
+    text_surface = render_text_surface(text, pil_font, tuple(rgb_color))
     
     # Draw the text surface on the main surface
     ctx.set_source_surface(text_surface, position_x, position_y)
@@ -527,6 +541,23 @@ def draw_text_with_pil(ctx, text, x, y, pil_font, rgb_color=(1, 1, 1), centered=
     
     return text_width, text_height
 
+def fill_background_gradient(ctx, width, height, rgb_color):
+    """
+    Fill the card with the dark top-to-bottom gradient in a single fill
+    
+    The base alpha runs from 180/255 down by half a step per row. Each row used
+    to be covered by two overlapping 2px scanlines, so the stops use that
+    doubled-up alpha to keep the established look.
+    """
+    top_alpha = 180 / 255.0
+    bottom_alpha = (180 - height * 0.5) / 255.0
+    gradient = cairo.LinearGradient(0, 0, 0, height)
+    gradient.add_color_stop_rgba(0, *rgb_color, 1 - (1 - top_alpha) ** 2)
+    gradient.add_color_stop_rgba(1, *rgb_color, 1 - (1 - bottom_alpha) ** 2)
+    ctx.set_source(gradient)
+    ctx.rectangle(0, 0, width, height)
+    ctx.fill()
+
 # Pre-render common elements at module load time
 def initialize_template_cache():
     """Pre-render common elements like background gradients, frames, etc."""
@@ -536,15 +567,16 @@ def initialize_template_cache():
     ctx = cairo.Context(surface)
     
     # Create dark gradient background 
-    for y in range(height):
-        # Dark gradient from top to bottom
-        alpha = (180 - int(y * 0.5)) / 255.0
-        ctx.set_source_rgba(DEFAULT_BG_COLOR[0], DEFAULT_BG_COLOR[1], DEFAULT_BG_COLOR[2], alpha)
-        ctx.move_to(0, y)
-        ctx.line_to(width, y)
-        ctx.stroke()
+    fill_background_gradient(ctx, width, height, DEFAULT_BG_COLOR)
     
     # Add some noise for texture
+    draw_stars(ctx, width, height)
+    
+    # Store in cache
+    TEMPLATE_CACHE.set('level_card_bg', surface)
+
+def draw_stars(ctx, width, height):
+    """Scatter faint white dots over the area for a subtle star texture"""
     for x in range(0, width, 3):
         for y in range(0, height, 3):
             if random.random() > 0.97:  # 3% chance
@@ -553,13 +585,19 @@ def initialize_template_cache():
                 ctx.set_source_rgba(1, 1, 1, alpha)
                 ctx.arc(x + size/2, y + size/2, size/2, 0, 2 * math.pi)
                 ctx.fill()
-    
-    # Store in cache
-    TEMPLATE_CACHE.set('level_card_bg', surface)
+
+def render_stars_surface(width, height):
+    """Render the star texture once into a transparent surface that cards can paint"""
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    draw_stars(cairo.Context(surface), width, height)
+    return surface
 
 # Call initialization during module import
 initialize_template_cache()
 
+# Star texture for level cards, rendered once instead of per card
+LEVEL_CARD_STARS = render_stars_surface(500, 180)
+
 def rounded_rectangle(ctx, x, y, width, height, radius):
     """Helper function to draw rounded rectangle in Cairo"""
     # Top left corner
@@ -639,7 +677,7 @@ def _generate_level_card_cairo_sync(avatar_bytes, username, user_id, level, xp,
     if background_path and os.path.exists(background_path):
         try:
             logging.info(f"Loading background from path: {background_path}")
-            background_surface = load_image_surface(background_path, width, height)
+            background_surface = get_background_surface(background_path, width, height)
 
             if background_surface:
                 ctx.save()
@@ -662,23 +700,11 @@ def _generate_level_card_cairo_sync(avatar_bytes, username, user_id, level, xp,
     
     # Create dark gradient background if needed
     if use_default_background:
-        for y in range(height):
-            # Dark gradient from top to bottom
-            alpha = (180 - int(y * 0.5)) / 255.0
-            ctx.set_source_rgba(background_color[0], background_color[1], background_color[2], alpha)
-            ctx.move_to(0, y)
-            ctx.line_to(width, y)
-            ctx.stroke()
+        fill_background_gradient(ctx, width, height, background_color)
     
     # Add slight noise for texture (stars effect)
-    for x in range(0, width, 3):
-        for y in range(0, height, 3):
-            if random.random() > 0.97:  # 3% chance for more stars
-                alpha = random.randint(10, 50) / 255.0
-                size = random.randint(1, 2)
-                ctx.set_source_rgba(1, 1, 1, alpha)  # White color with random alpha
-                ctx.arc(x + size/2, y + size/2, size/2, 0, 2 * math.pi)
-                ctx.fill()
+    ctx.set_source_surface(LEVEL_CARD_STARS, 0, 0)
+    ctx.paint()
     
     # Avatar settings
     avatar_size = 90
@@ -689,23 +715,13 @@ def _generate_level_card_cairo_sync(avatar_bytes, username, user_id, level, xp,
     draw_default_avatar = True
     if avatar_bytes:
         try:
-            # Load avatar from bytes
-            avatar_io = io.BytesIO(avatar_bytes)
-            avatar_surface = load_surface_from_bytes(avatar_io, avatar_size, avatar_size)
+            # Load avatar from bytes (cached per avatar and size)
+            avatar_surface = get_avatar_surface(avatar_bytes, avatar_size)
             
             if avatar_surface:
-                # Draw with circular mask
-                ctx.save()
-                
-                # Create circular clipping path
-                ctx.arc(avatar_pos_x + avatar_size/2, avatar_pos_y + avatar_size/2, 
-                       avatar_size/2, 0, 2 * math.pi)
-                ctx.clip()
-                
-                # Draw avatar
+                # Draw avatar (already cropped to a circle)
                 ctx.set_source_surface(avatar_surface, avatar_pos_x, avatar_pos_y)
                 ctx.paint()
-                ctx.restore()
                 
                 # Add a thin border around avatar
                 ctx.arc(avatar_pos_x + avatar_size/2, avatar_pos_y + avatar_size/2, 
@@ -1394,31 +1410,13 @@ def _generate_leaderboard_cairo_sync(guild_name, member_data, rows, start_rank=1
             avatar_position = (50, y_offset + 15)
             try:
                 if avatar_bytes:
-                    # Check if we've already processed this avatar
-                    avatar_hash = hash(str(avatar_bytes))
-                    avatar_key = f"lb_avatar_{avatar_hash}"
-                    
-                    # Try to get from cache first
-                    avatar_surface = TEMPLATE_CACHE.get(avatar_key)
-                    
-                    if avatar_surface is None:
-                        # Process avatar with circular mask
-                        avatar_io = io.BytesIO(avatar_bytes)
-                        avatar_surface = load_surface_from_bytes(avatar_io, avatar_size, avatar_size)
-                        
-                        # Cache the processed avatar
-                        if avatar_surface:
-                            TEMPLATE_CACHE.set(avatar_key, avatar_surface)
+                    # Reuse the processed avatar if we've drawn it before
+                    avatar_surface = get_avatar_surface(avatar_bytes, avatar_size)
                     
                     if avatar_surface:
-                        # Draw with circular mask
-                        ctx.save()
-                        ctx.arc(avatar_position[0] + avatar_size//2, avatar_position[1] + avatar_size//2, 
-                                avatar_size//2, 0, 2 * math.pi)
-                        ctx.clip()
+                        # Draw avatar (already cropped to a circle)
                         ctx.set_source_surface(avatar_surface, avatar_position[0], avatar_position[1])
                         ctx.paint()
-                        ctx.restore()
                         
                         # Add a circle border
                         ctx.arc(avatar_position[0] + avatar_size//2, avatar_position[1] + avatar_size//2, 
@@ -1603,28 +1601,21 @@ async def generate_leaderboard_image(guild, rows, start_rank=1):
     try:
         # Prepare member data with optimized avatar loading
         member_data = {}
-        avatar_load_tasks = []
+        avatar_members = {}
         
-        # Create tasks for parallel avatar loading
         for user_id, _, _ in rows:
             member = guild.get_member(int(user_id))
             if member:
-                # Add a task to load the avatar asynchronously
-                avatar_load_tasks.append((user_id, get_cached_avatar(member, None)))
+                avatar_members[user_id] = member
                 # Initialize the member name, we'll add the avatar later
                 member_data[user_id] = (member.display_name, None)
             else:
                 member_data[user_id] = (f"User {user_id}", None)
         
-        # Wait for all avatar loading tasks to complete
-        for user_id, avatar_task in avatar_load_tasks:
-            try:
-                avatar_bytes = await avatar_task
-                if user_id in member_data:
-                    member_data[user_id] = (member_data[user_id][0], avatar_bytes)
-            except Exception as e:
-                logging.error(f"Error loading avatar for {user_id}: {e}")
-                # Keep the existing entry with None avatar
+        # Load all avatars concurrently (failed loads come back as None)
+        avatars = await get_cached_avatars(avatar_members.values())
+        for user_id, avatar_bytes in zip(avatar_members, avatars):
+            member_data[user_id] = (member_data[user_id][0], avatar_bytes)
         
         # Generate the image in a thread
         result = await run_in_executor(_generate_leaderboard_cairo_sync)(
@@ -0,0 +1,58 @@
+import logging
+import aiohttp
+from typing import Optional
+
+# Shared HTTP session so avatar and background downloads reuse keep-alive
+# connections to the Discord CDN instead of reconnecting on every request
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared HTTP session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+        )
+    return _session
+
+async def close_session():
+    """Close the shared HTTP session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("Shared HTTP session closed")
+    _session = None
+
+async def read_body(resp: aiohttp.ClientResponse, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Read a response body into a buffer sized from Content-Length
+    
+    The buffer is only preallocated when the length is known and the body is
+    not content-encoded (the header then gives the compressed size).
+    
+    Raises:
+        ValueError: If max_bytes is given and the body is larger
+    """
+    length = resp.content_length
+    if max_bytes is not None and length and length > max_bytes:
+        raise ValueError(f"Response of {length} bytes exceeds the {max_bytes} byte limit")
+    
+    if length and not resp.headers.get("Content-Encoding"):
+        buf = bytearray(length)
+    elif max_bytes is None:
+        return await resp.read()
+    else:
+        buf = bytearray()
+    
+    offset = 0
+    async for chunk in resp.content.iter_chunked(65536):
+        # Enforce the limit while streaming, since the header can be missing or wrong
+        if max_bytes is not None and offset + len(chunk) > max_bytes:
+            raise ValueError(f"Response exceeds the {max_bytes} byte limit")
+        # Slice assignment grows the buffer if the server sends more than it announced
+        buf[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    
+    # Trim any unused tail if the body came up short
+    del buf[offset:]
+    return bytes(buf)
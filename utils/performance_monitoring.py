@@ -168,13 +168,12 @@ def time_function(function=None, *, name=None, log_always=False):
 # ======= 3. Session Metrics =======
 
 @tasks.loop(seconds=SESSION_METRICS_INTERVAL)
-async def session_metrics_monitor():
+async def session_metrics_monitor(bot):
     """Periodically log voice session metrics"""
     try:
-        # Get the voice_sessions dictionary without importing it directly
-        # This avoids circular imports
-        from modules import voice_activity
-        voice_sessions = getattr(voice_activity, 'voice_sessions', {})
+        # Read the sessions through the bot's voice tracker; importing voice_activity here would be circular
+        voice_tracker = getattr(bot, 'voice_tracker', None)
+        voice_sessions = voice_tracker.sessions if voice_tracker else {}
         
         if not voice_sessions:
             logging.info("Session metrics: No active voice sessions")
@@ -182,11 +181,11 @@ async def session_metrics_monitor():
             
         # Basic metrics
         total_sessions = len(voice_sessions)
-        sessions_with_history = sum(1 for session in voice_sessions.values() if "state_history" in session)
+        sessions_with_history = sum(1 for session in voice_sessions.values() if session.state_history)
         
         # History metrics
         total_history_entries = sum(
-            len(session.get("state_history", [])) 
+            len(session.state_history) 
             for session in voice_sessions.values()
         )
         avg_history_size = total_history_entries / sessions_with_history if sessions_with_history > 0 else 0
@@ -194,16 +193,15 @@ async def session_metrics_monitor():
         # State distribution
         states = {}
         for session in voice_sessions.values():
-            state = session.get("current_state", "unknown")
+            state = str(session.current_state)
             states[state] = states.get(state, 0) + 1
         
         # Session age metrics
         current_time = time.time()
         session_ages = []
         for session in voice_sessions.values():
-            if "state_start_time" in session:
-                age = current_time - session["state_start_time"]
-                session_ages.append(age)
+            age = current_time - session.state_start_time
+            session_ages.append(age)
         
         oldest_session = max(session_ages) if session_ages else 0
         avg_session_age = sum(session_ages) / len(session_ages) if session_ages else 0
@@ -239,7 +237,7 @@ async def start_monitoring(bot):
         logging.info("Memory usage monitoring started")
     
     # Start session metrics monitoring
-    session_metrics_monitor.start()
+    session_metrics_monitor.start(bot)
     logging.info("Voice session metrics monitoring started")
     
     # Create a monitoring status command
@@ -281,13 +279,13 @@ async def start_monitoring(bot):
         
         # Voice session metrics
         try:
-            # Get voice_sessions without directly importing it
-            from modules import voice_activity
-            voice_sessions = getattr(voice_activity, 'voice_sessions', {})
+            # Get voice sessions without directly importing voice_activity
+            voice_tracker = getattr(bot, 'voice_tracker', None)
+            voice_sessions = voice_tracker.sessions if voice_tracker else {}
             
             total_sessions = len(voice_sessions)
             total_history = sum(
-                len(session.get("state_history", [])) 
+                len(session.state_history) 
                 for session in voice_sessions.values()
             )
             